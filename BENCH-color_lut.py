@@ -0,0 +1,68 @@
+import time
+
+import cv2
+import numpy as np
+
+from color_lut import LutThreshold, build_mask_lut, hsv_in_range
+
+# Same thresholds as camera_control
+hueLow, hueHigh = 170, 190
+satLow, satHigh = 70, 255
+valLow, valHigh = 50, 255
+
+RESOLUTIONS = [(320, 240), (640, 480)]
+REPEATS = 200
+
+
+def make_frame(width, height, seed=0):
+    """Noisy background with a red blob in both halves of the hue wrap."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    cv2.rectangle(frame, (width // 4, height // 4), (width // 2, height // 2), (40, 0, 230), -1)  # hue ~175
+    cv2.rectangle(frame, (width // 2, height // 2), (3 * width // 4, 3 * height // 4), (0, 30, 220), -1)  # hue ~4
+    return frame
+
+
+def time_per_frame(fn, frame):
+    fn(frame)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fn(frame)
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    lower, upper = (hueLow, satLow, valLow), (hueHigh, satHigh, valHigh)
+
+    start = time.perf_counter()
+    build_mask_lut(lower, upper)
+    build_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    build_mask_lut(lower, upper)
+    cached_ms = (time.perf_counter() - start) * 1000
+    print(f"LUT build: {build_ms:.1f} ms cold, {cached_ms:.3f} ms cached")
+
+    lut_threshold = LutThreshold(lower, upper)
+
+    def two_pass(frame):
+        # What process_video did before: one hue range, no wraparound
+        frameHSV = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        return cv2.inRange(frameHSV, np.array([hueLow, satLow, valLow]), np.array([179, satHigh, valHigh]))
+
+    def two_pass_wrapped(frame):
+        return hsv_in_range(cv2.cvtColor(frame, cv2.COLOR_BGR2HSV), lower, upper)
+
+    for width, height in RESOLUTIONS:
+        frame = make_frame(width, height)
+        reference = two_pass_wrapped(frame)
+        print(f"\n{width}x{height}")
+        for name, fn in [('cvtColor+inRange', two_pass),
+                         ('cvtColor+inRange (wrapped)', two_pass_wrapped),
+                         ('LUT', lut_threshold)]:
+            ms = time_per_frame(fn, frame)
+            agreement = np.mean(fn(frame) == reference) * 100
+            print(f"  {name:28s} {ms:7.3f} ms/frame  {agreement:6.2f}% agree with wrapped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Runs planned moves on the simulated backend and reports how well the engine keeps to the plan.
+
+For each profile and cruise rate, one move is stepped out by a real
+MotionEngine thread and the recorded pulse times are compared with the
+planned interval table. Interval error and late pulses show how fast this
+machine's scheduling can drive the motor before the timing falls apart;
+run it on the Pi to find the usable limit there.
+
+Usage:
+    python BENCH-motion_profile.py
+    python BENCH-motion_profile.py --distance 4000 --rates 500 1000 2000 2500
+"""
+import argparse
+
+import motion_profile
+from motor_control import ACCELERATION, MotionEngine, SimulatedBackend, STEP_PIN
+
+
+def measure(distance, rate, acceleration, shape):
+    backend = SimulatedBackend()
+    engine = MotionEngine(backend, acceleration=acceleration, profile=shape)
+    engine.start()
+    engine.move(distance, rate)
+    engine.wait_idle()
+    engine.shutdown()
+    report = backend.jitter(STEP_PIN, motion_profile.plan(distance, rate, acceleration, shape))
+    report['late_pulses'] = engine.late_pulses
+    report['max_lateness_us'] = engine.max_lateness * 1e6
+    report['duration_s'] = motion_profile.duration(distance, rate, acceleration, shape)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure step timing jitter against planned motion profiles.")
+    parser.add_argument('--distance', type=int, default=2000, help="Steps per move")
+    parser.add_argument('--acceleration', type=float, default=ACCELERATION, help="Steps per second squared")
+    parser.add_argument('--rates', type=float, nargs='+', default=[500, 1000, 1500, 2000, 2500],
+                        help="Cruise rates to try, steps per second")
+    args = parser.parse_args()
+
+    print(f"{args.distance}-step moves at {args.acceleration:.0f} steps/s^2")
+    for shape in motion_profile.PROFILES:
+        for rate in args.rates:
+            r = measure(args.distance, rate, args.acceleration, shape)
+            print(f"  {shape:9s} {rate:6.0f} steps/s  move {r['duration_s']:.3f} s  "
+                  f"interval error mean {r['mean_us']:7.1f} us  p99 {r['p99_us']:7.1f} us  max {r['max_us']:8.1f} us  "
+                  f"peak {r['peak_rate']:6.0f} steps/s  late {r['late_pulses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Closes the pan loop around a simulated plant and reports settle time and overshoot.
+
+The camera delivers detections at CAMERA_FPS with CAMERA_LATENCY of delay,
+the turret turns at whatever velocity it is commanded (in whole steps), and
+the fixed-rate PanController runs at CONTROL_RATE on the pipeline's error
+estimate. The old per-frame step-burst control is run on the same plant
+for comparison.
+
+Usage:
+    python BENCH-pan_control.py
+"""
+import math
+
+from pan_controller import CONTROL_RATE, DEADBAND, PanController
+from target_detection import Detection
+from vision_pipeline import PIXELS_PER_STEP, VisionPipeline
+from motor_control import STEP_RATE
+
+FRAME_WIDTH = 320
+CAMERA_FPS = 5
+CAMERA_LATENCY = 0.08  # Seconds from exposure to the detection reaching the pipeline
+DURATION = 4.0
+SETTLE_BAND = 2 * DEADBAND  # Pixels
+
+
+class PlantEngine:
+    """Stands in for MotionEngine: integrates velocity or steps toward a target, in whole steps."""
+
+    def __init__(self, step_rate=STEP_RATE):
+        self.step_rate = step_rate
+        self.velocity = 0.0
+        self.target = None
+        self._position = 0.0
+
+    @property
+    def position(self):
+        return int(self._position)
+
+    def set_velocity(self, velocity):
+        self.target = None
+        self.velocity = velocity
+
+    def move(self, steps, direction):
+        self.target = self.position + (steps if direction == 'R' else -steps)
+
+    def advance(self, dt):
+        if self.target is not None:
+            remaining = self.target - self._position
+            self._position += max(-self.step_rate * dt, min(self.step_rate * dt, remaining))
+        else:
+            self._position += self.velocity * dt
+
+
+def simulate(trajectory, closed_loop):
+    """Returns (times, pixel errors) for a target following `trajectory(t)` in world pixels."""
+    plant = PlantEngine()
+    pipeline = VisionPipeline(FRAME_WIDTH, move=plant.move, closed_loop=closed_loop,
+                              motor_position=lambda: plant.position)
+    controller = None
+    if closed_loop:
+        controller = PanController(plant, pipeline.pan_error, feedforward=pipeline.pan_feedforward)
+    center = FRAME_WIDTH // 2
+    dt = 1.0 / CONTROL_RATE
+    frame_period = 1.0 / CAMERA_FPS
+    pending = []  # (deliver_at, frame_time, image_x)
+    next_frame = 0.0
+    times, errors = [], []
+
+    for tick in range(int(DURATION * CONTROL_RATE)):
+        t = tick * dt
+        image_x = trajectory(t) - PIXELS_PER_STEP * plant.position
+        if t >= next_frame:
+            pending.append((t + CAMERA_LATENCY, t, image_x))
+            next_frame += frame_period
+        while pending and pending[0][0] <= t:
+            _, frame_time, seen_x = pending.pop(0)
+            x = int(round(seen_x))
+            target = Detection(x - 20, 100, 40, 60, x, 130, 2400.0) if 0 <= x < FRAME_WIDTH else None
+            pipeline.control(target, frame_time, now=t)
+        if controller is not None:
+            controller.tick(dt, now=t)
+        plant.advance(dt)
+        times.append(t)
+        errors.append(image_x - center)
+    return times, errors
+
+
+def settle_time(times, errors):
+    for index in range(len(errors)):
+        if all(abs(error) <= SETTLE_BAND for error in errors[index:]):
+            return times[index]
+    return math.inf
+
+
+def overshoot(errors):
+    """Largest excursion past center, as a percentage of the initial error."""
+    initial = errors[0]
+    if initial == 0:
+        return 0.0
+    past = [-error * math.copysign(1, initial) for error in errors]
+    return max(0.0, max(past)) / abs(initial) * 100
+
+
+def main():
+    scenarios = {
+        'step 100 px': lambda t: FRAME_WIDTH // 2 + 100,
+        'walk 60 px/s': lambda t: FRAME_WIDTH // 2 + 60 + 60 * t,
+        'sprint 200 px/s': lambda t: FRAME_WIDTH // 2 + 40 + 200 * min(t, 2.0),
+    }
+    print(f"Plant: {CAMERA_FPS} fps camera, {CAMERA_LATENCY * 1000:.0f} ms latency, "
+          f"{PIXELS_PER_STEP} px/step, controller at {CONTROL_RATE} Hz")
+    for name, trajectory in scenarios.items():
+        for label, closed_loop in (('fixed-rate PID', True), ('per-frame bursts', False)):
+            times, errors = simulate(trajectory, closed_loop)
+            tail = errors[-CONTROL_RATE:]
+            print(f"  {name:16s} {label:17s} settle {settle_time(times, errors):6.2f} s  "
+                  f"overshoot {overshoot(errors):5.1f} %  final |error| {max(abs(e) for e in tail):6.1f} px")
+
+
+if __name__ == "__main__":
+    main()
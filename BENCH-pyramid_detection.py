@@ -0,0 +1,92 @@
+"""
+Compares the 'contour' and 'pyramid' detection methods for speed and centroid stability.
+
+A synthetic target, an irregular blob that slowly turns, drifts across a
+noisy background in sub-pixel steps. Each method detects it on every frame
+and is scored on time per frame and on how far its centroid lands from
+the blob's true centroid (taken from the polygon the blob is drawn from).
+A steady centroid matters more than a fast one here: the tracker and the
+pan loop read centroid noise as target motion.
+
+Usage:
+    python BENCH-pyramid_detection.py
+    python BENCH-pyramid_detection.py --frames 300 --tracking
+"""
+import argparse
+import math
+import time
+
+import cv2
+import numpy as np
+
+from target_detection import METHODS, RedTargetDetector
+from vision_pipeline import hueHigh, hueLow, min_contour_area, satHigh, satLow, valHigh, valLow
+
+RESOLUTIONS = [(320, 240), (640, 480)]
+SHIFT = 4  # Sub-pixel bits for cv2.fillPoly
+
+
+def blob_outline(center, radius, angle, points=48):
+    """Vertices of a lumpy, jersey-like outline turned by `angle`."""
+    theta = np.linspace(0, 2 * math.pi, points, endpoint=False)
+    r = radius * (1 + 0.25 * np.sin(3 * theta + angle) + 0.12 * np.cos(5 * theta - 2 * angle))
+    return np.stack([center[0] + r * np.cos(theta), center[1] + 0.8 * r * np.sin(theta)], axis=1)
+
+
+def make_frames(width, height, count, seed=0):
+    """Yields (frame, true centroid) for a blob drifting left to right."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 120, (height, width, 3), dtype=np.uint8)
+    radius = height / 8
+    for i in range(count):
+        t = i / max(1, count - 1)
+        center = (width * (0.25 + 0.5 * t), height * (0.5 + 0.1 * math.sin(4 * math.pi * t)))
+        outline = blob_outline(center, radius, 2 * math.pi * t).astype(np.float32)
+        frame = background.copy()
+        cv2.fillPoly(frame, [np.round(outline * (1 << SHIFT)).astype(np.int32)], (40, 0, 230), shift=SHIFT)
+        noise = rng.integers(-12, 13, frame.shape, dtype=np.int16)
+        frame = np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+        moments = cv2.moments(outline)
+        yield frame, (moments['m10'] / moments['m00'], moments['m01'] / moments['m00'])
+
+
+def measure(method, frames, tracking):
+    detector = RedTargetDetector((hueLow, satLow, valLow), (hueHigh, satHigh, valHigh), min_contour_area,
+                                 tracking=tracking, method=method)
+    times, errors = [], []
+    for frame, truth in frames:
+        start = time.perf_counter()
+        target = detector.detect(frame)
+        times.append(time.perf_counter() - start)
+        if target is not None:
+            errors.append((target.center_x - truth[0], target.center_y - truth[1]))
+    times = np.asarray(times[1:]) * 1000  # The first frame also builds the lookup table
+    errors = np.asarray(errors)
+    distance = np.hypot(errors[:, 0], errors[:, 1])
+    # Frame-to-frame change in the error is what the tracker sees as spurious motion
+    jitter = np.hypot(*np.diff(errors, axis=0).T) if len(errors) > 1 else np.zeros(1)
+    return {
+        'mean_ms': float(times.mean()), 'p95_ms': float(np.percentile(times, 95)),
+        'detected': len(errors), 'rms_error_px': float(np.sqrt((distance ** 2).mean())),
+        'max_error_px': float(distance.max()), 'jitter_px': float(jitter.std()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare detection methods for speed and centroid stability.")
+    parser.add_argument('--frames', type=int, default=200, help="Frames per run")
+    parser.add_argument('--tracking', action='store_true', help="Search a window around the last hit")
+    args = parser.parse_args()
+
+    for width, height in RESOLUTIONS:
+        frames = list(make_frames(width, height, args.frames))
+        print(f"\n{width}x{height}, {args.frames} frames, tracking {'on' if args.tracking else 'off'}")
+        for method in METHODS:
+            r = measure(method, frames, args.tracking)
+            print(f"  {method:8s} {r['mean_ms']:6.3f} ms/frame (p95 {r['p95_ms']:6.3f})  "
+                  f"detected {r['detected']:4d}  centroid error rms {r['rms_error_px']:5.2f} px  "
+                  f"max {r['max_error_px']:5.2f} px  jitter {r['jitter_px']:5.2f} px")
+
+
+if __name__ == "__main__":
+    main()
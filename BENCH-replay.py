@@ -0,0 +1,214 @@
+"""
+Replays recorded frames through the vision pipeline and reports its speed.
+
+Feeds a video file, a directory of images or a flight recorder dump (.npz)
+through the same detection and closed-loop control code process_video runs,
+with the motor on a simulated backend, so it works on any machine without a
+camera or RPi.GPIO.
+
+Usage:
+    python BENCH-replay.py clip.mp4 --output results.json
+    python BENCH-replay.py frames_dir/ --encode --loops 3
+    python BENCH-replay.py recordings/flight-20250101-120000-limit.npz
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+import motor_control
+from flight_recorder import is_recording, read_recording
+from frame_encoder import PublishedFrame
+from pan_controller import PanController
+from target_detection import METHODS
+from vision_pipeline import VisionPipeline
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def iter_frames(source):
+    """Yields BGR frames from a video file, a directory of images or a flight recorder dump."""
+    if is_recording(source):
+        yield from read_recording(source)[2]
+        return
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names:
+            frame = cv2.imread(os.path.join(source, name))
+            if frame is not None:
+                yield frame
+        return
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise SystemExit(f"Error: Could not open {source}")
+    try:
+        while True:
+            success, frame = cap.read()
+            if not success:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def summarize(samples):
+    """Returns mean and p50/p95/p99 of a list of seconds, in milliseconds."""
+    if not samples:
+        return {}
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {'mean': float(ms.mean()), 'p50': float(p50), 'p95': float(p95), 'p99': float(p99),
+            'max': float(ms.max())}
+
+
+def describe_machine():
+    machine = {'platform': platform.platform(), 'machine': platform.machine(), 'python': platform.python_version(),
+               'opencv': cv2.__version__}
+    try:
+        with open('/proc/device-tree/model') as model:  # Names the Pi model on Raspberry Pi OS
+            machine['model'] = model.read().strip('\x00\n')
+    except OSError:
+        pass
+    try:
+        machine['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                           text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return machine
+
+
+def run(source, loops=1, encode=False, tracking=True, max_frames=None, fps=None, method='contour', gate=True):
+    """
+    Runs the replay and returns the results dictionary.
+
+    Frames get capture timestamps spaced at `fps` (the camera rate the
+    recording was made at), so the target tracker sees the same motion it
+    would live. The pipeline's clock is that timestamp plus the time the
+    frame actually took to process here. A flight recorder dump supplies
+    its own frame rate unless `fps` is given; otherwise it defaults to 5.
+
+    The pipeline runs closed-loop, as process_video does. The pan and tilt
+    PanControllers, which live run on their own thread, are ticked by hand
+    at their fixed rate on the replay clock up to the next frame; that
+    work is the 'controller' stage and not part of the frame latency.
+    """
+    if fps is None:
+        fps = (read_recording(source)[0]['fps'] if is_recording(source) else 0.0) or 5.0
+    engine = motor_control.setup_motor_gpio(motor_control.SimulatedBackend())
+    pipeline = None
+    controllers = []
+    tick_time = 0.0  # Replay clock time of the next controller tick
+    stages = {'read': [], 'detect': [], 'control': [], 'controller': []}
+    if encode:
+        stages['encode'] = []
+    latencies = []
+    frames = detections = 0
+
+    start = time.perf_counter()
+    for _ in range(loops):
+        iterator = iter_frames(source)
+        while max_frames is None or frames < max_frames:
+            t_read = time.perf_counter()
+            frame = next(iterator, None)
+            if frame is None:
+                break
+            t_detect = time.perf_counter()
+            if pipeline is None:
+                pipeline = VisionPipeline(frame.shape[1], closed_loop=True, frame_height=frame.shape[0], gate=gate)
+                pipeline.detector.tracking = tracking
+                pipeline.detector.method = method
+                controllers = [PanController(engine, pipeline.pan_error, feedforward=pipeline.pan_feedforward),
+                               PanController(engine, pipeline.tilt_error, feedforward=pipeline.tilt_feedforward,
+                                             axis='tilt')]
+            target = pipeline.detect(frame)
+            t_control = time.perf_counter()
+            frame_time = frames / fps
+            pipeline.control(target, frame_time, now=frame_time + t_control - t_read)
+            t_done = time.perf_counter()
+
+            stages['read'].append(t_detect - t_read)
+            stages['detect'].append(t_control - t_detect)
+            stages['control'].append(t_done - t_control)
+            if encode:
+                PublishedFrame(frame, target, pipeline.detector.full_mask(frame.shape)).jpeg()
+                stages['encode'].append(time.perf_counter() - t_done)
+            latencies.append(time.perf_counter() - t_read)
+            t_tick = time.perf_counter()
+            while tick_time < (frames + 1) / fps:
+                for controller in controllers:
+                    controller.tick(1.0 / controller.rate_hz, now=tick_time)
+                tick_time += 1.0 / controllers[0].rate_hz
+            stages['controller'].append(time.perf_counter() - t_tick)
+            frames += 1
+            detections += target is not None
+    elapsed = time.perf_counter() - start
+
+    for controller in controllers:
+        controller.stop()
+    engine.wait_idle(timeout=5.0)
+    results = {
+        'source': source,
+        'frames': frames,
+        'detections': detections,
+        'tracking': tracking,
+        'method': method,
+        'encode': encode,
+        'source_fps': fps,
+        'elapsed_s': elapsed,
+        'fps': frames / elapsed if elapsed else 0.0,
+        'stages_ms': {name: summarize(samples) for name, samples in stages.items()},
+        'latency_ms': summarize(latencies),
+        'steps_issued': engine.steps_issued,
+        'machine': describe_machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    if pipeline is not None:
+        results['full_searches'] = pipeline.detector.full_searches
+        results['window_searches'] = pipeline.detector.window_searches
+        if pipeline.gate is not None:
+            results['gate_hit_rate'] = pipeline.gate.hit_rate
+            results['gate_saved_s'] = pipeline.gate.saved
+    motor_control.cleanup_motor_gpio()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded frames through the vision pipeline.")
+    parser.add_argument('source', help="Video file or directory of images")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--loops', type=int, default=1, help="Replay the source this many times")
+    parser.add_argument('--max-frames', type=int, help="Stop after this many frames")
+    parser.add_argument('--encode', action='store_true', help="Also JPEG-encode every frame like a viewer would")
+    parser.add_argument('--no-tracking', action='store_true', help="Search the full frame every time")
+    parser.add_argument('--no-gate', action='store_true', help="Run detection on every frame")
+    parser.add_argument('--method', choices=METHODS, default='contour', help="Detection method")
+    parser.add_argument('--fps', type=float,
+                        help="Frame rate the source was recorded at (default: from a dump, else 5)")
+    args = parser.parse_args()
+
+    results = run(args.source, loops=args.loops, encode=args.encode, tracking=not args.no_tracking,
+                  max_frames=args.max_frames, fps=args.fps, method=args.method,
+                  gate=not args.no_gate)
+    print(f"{results['frames']} frames, {results['fps']:.1f} fps, {results['detections']} detections, "
+          f"{results['steps_issued']} steps")
+    for name, summary in results['stages_ms'].items():
+        if summary:
+            print(f"  {name:10s} mean {summary['mean']:.3f} ms  p95 {summary['p95']:.3f} ms")
+    if 'gate_hit_rate' in results:
+        print(f"  motion gate hit rate {results['gate_hit_rate']:.0%}, saved {results['gate_saved_s'] * 1000:.1f} ms")
+    latency = results['latency_ms']
+    if latency:
+        print(f"  end-to-end p50 {latency['p50']:.3f} ms  p95 {latency['p95']:.3f} ms  p99 {latency['p99']:.3f} ms")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Tracks scripted targets on the simulated turret and reports control performance.
+
+Each scenario renders synthetic frames of a red target (walking, sprinting,
+changing direction) from a camera whose pan/tilt pose follows the step
+pulses the motion engine sends, and runs them through the real detection
+and control code; see turret_sim.run. Everything runs in real time, on any
+Linux machine without a camera, steppers or RPi.GPIO.
+
+The thresholds turn it into a regression check for CI: the script exits
+with status 1 if any run misses one.
+
+Usage:
+    python BENCH-turret_sim.py
+    python BENCH-turret_sim.py --scenario sprint --mode open --output results.json
+    python BENCH-turret_sim.py --max-rms 25 --max-settle 2.5 --min-loop-hz 12
+"""
+import argparse
+import json
+import sys
+import time
+
+import turret_sim
+from target_detection import METHODS
+
+
+def failures(result, max_rms=None, max_settle=None, min_loop_hz=None):
+    """Returns what a run got wrong against the thresholds, as text."""
+    found = []
+    rms = result['pan_error_px'].get('rms', float('inf'))
+    if max_rms is not None and rms > max_rms:
+        found.append(f"pan error rms {rms:.1f} px > {max_rms}")
+    if max_settle is not None:
+        for change, settle in zip(turret_sim.SCENARIOS[result['scenario']].changes, result['settle_s']):
+            if settle is None or settle > max_settle:
+                found.append(f"did not settle within {max_settle} s of t={change:.1f} s")
+    if min_loop_hz is not None and result['loop_hz'] < min_loop_hz:
+        found.append(f"loop rate {result['loop_hz']:.1f} Hz < {min_loop_hz}")
+    if result['step_mismatch']:
+        found.append(f"engine position is {result['step_mismatch']} steps off the pulses sent")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop tracking on a simulated turret.")
+    parser.add_argument('--scenario', choices=sorted(turret_sim.SCENARIOS), action='append',
+                        help="Run only this scenario (repeatable; default: all)")
+    parser.add_argument('--mode', choices=turret_sim.MODES + ('both',), default='both',
+                        help="Fixed-rate PanController ('closed'), per-frame move_motor ('open'), or both")
+    parser.add_argument('--fps', type=float, default=turret_sim.CAMERA_FPS, help="Simulated camera frame rate")
+    parser.add_argument('--method', choices=METHODS, help="Detection method (default: the pipeline's)")
+    parser.add_argument('--no-gate', action='store_true', help="Run detection on every frame")
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--max-rms', type=float, help="Fail if the pan error rms exceeds this many pixels")
+    parser.add_argument('--max-settle', type=float, help="Fail if any settle time exceeds this many seconds")
+    parser.add_argument('--min-loop-hz', type=float, help="Fail if the vision loop runs slower than this")
+    args = parser.parse_args()
+
+    scenarios = args.scenario or list(turret_sim.SCENARIOS)
+    modes = turret_sim.MODES if args.mode == 'both' else (args.mode,)
+    scene = turret_sim.TurretScene()
+    results, failed = [], False
+    print(f"{turret_sim.FRAME_SIZE[0]}x{turret_sim.FRAME_SIZE[1]} at {args.fps:g} fps, "
+          f"{turret_sim.CAMERA_LATENCY * 1000:.0f} ms latency, settle band {turret_sim.SETTLE_BAND} px")
+    for name in scenarios:
+        for mode in modes:
+            result = turret_sim.run(name, mode, fps=args.fps, method=args.method, gate=not args.no_gate, scene=scene)
+            results.append(result)
+            settle = ", ".join('never' if s is None else f"{s:.2f}" for s in result['settle_s'])
+            pan, tilt = result['pan_error_px'], result['tilt_error_px']
+            print(f"  {name:17s} {mode:6s} pan rms {pan['rms']:6.1f} px (max {pan['max']:6.1f})  "
+                  f"tilt rms {tilt['rms']:5.1f} px  settle [{settle}] s  "
+                  f"{result['steps_per_s']:6.0f} steps/s  {result['loop_hz']:4.1f} Hz  "
+                  f"process p95 {result['process_ms']['p95']:.2f} ms  detected {result['detection_rate']:.0%}")
+            for problem in failures(result, args.max_rms, args.max_settle, args.min_loop_hz):
+                print(f"    FAIL: {problem}")
+                failed = True
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'results': results, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}, output, indent=2)
+        print(f"Results written to {args.output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,13 @@
 import cv2
-import numpy as np
 import RPi.GPIO as GPIO
 import time
 import threading
 from flask import Flask, Response
+from capture_governor import CaptureGovernor
+from color_lut import HsvThreshold
+from target_detection import Detection
+import realtime
+import telemetry
 
 # Flask setup
 app = Flask(__name__)
@@ -14,15 +18,20 @@ if not cap.isOpened():
     print("Error: Could not open video device")
     exit()
 
-# Set lower resolution for processing load
+# Start at a low resolution for processing load; the governor adjusts it from there
+REFERENCE_WIDTH = 320  # Width the pixel thresholds below are tuned for
 cap.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
 cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 240)
+governor = CaptureGovernor(mode=(320, 240, 5))
+cap.set(cv2.CAP_PROP_FPS, 5)
 
 # HSV color thresholding values for red
-hueLow, hueHigh = 168, 179
+hueLow, hueHigh = 168, 190  # Wraps past 180 to also catch hue 0-10
 satLow, satHigh = 101, 255
 valLow, valHigh = 45, 255
 min_contour_area = 500
+realtime.configure_opencv()
+red_threshold = HsvThreshold((hueLow, satLow, valLow), (hueHigh, satHigh, valHigh))
 
 # GPIO setup for Pan Motor and Limit Switches
 PAN_DIR_PIN = 21    # Direction pin
@@ -41,9 +50,20 @@ center_tolerance = 30  # Allowable tolerance around the center_x_target for smoo
 running = False
 motor_thread = None
 resetting = False  
+frame_seq = 0
+# Per-frame decisions go to a binary log instead of the console; read it back with telemetry.read_session()
+log = telemetry.TelemetryWriter(telemetry.session_path())
+log_lock = threading.Lock()  # Every viewer runs generate_frames on its own Flask thread; the writer is not thread-safe
+
+# Function to write one telemetry record from any viewer thread
+def log_record(*args, **kwargs):
+    with log_lock:
+        log.record(*args, **kwargs)
 
 # Function to control the pan motor with slower adjustable speed
 def run_pan_motor(step_delay):
+    realtime.pin_thread(realtime.MOTION_CPUS)
+    realtime.set_fifo(realtime.MOTION_PRIORITY)
     while running:
         GPIO.output(PAN_STEP_PIN, GPIO.HIGH)
         time.sleep(step_delay)
@@ -84,17 +104,27 @@ def reset_to_center(direction, duration=2.3):  # Increased duration for slower r
         time.sleep(0.0005)
     resetting = False  # Reset complete
 
+# Function to read the closed limit switches as telemetry limit bits
+def limit_bits():
+    return ((GPIO.input(LIMIT_SWITCH_1_PIN) == GPIO.LOW) * telemetry.LIMIT_LEFT
+            | (GPIO.input(LIMIT_SWITCH_2_PIN) == GPIO.LOW) * telemetry.LIMIT_RIGHT)
+
 # Function to process frames and detect movement
 def generate_frames():
-    global previous_center_x
+    global previous_center_x, frame_seq
     while True:
         success, frame = cap.read()
         if success:
-            # Convert to HSV and create mask
-            frameHSV = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            lowerBound = np.array([hueLow, satLow, valLow])
-            upperBound = np.array([hueHigh, satHigh, valHigh])
-            mask = cv2.inRange(frameHSV, lowerBound, upperBound)
+            started = time.time()
+            with log_lock:
+                frame_seq += 1
+                seq = frame_seq
+            scale = frame.shape[1] / REFERENCE_WIDTH  # Pixel thresholds follow the resolution
+            target_x = center_x_target * scale
+            tolerance = center_tolerance * scale
+
+            # Create mask; the hue range wraps past 180
+            mask = red_threshold(frame)
 
             # Find contours and select the largest one
             contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -102,28 +132,32 @@ def generate_frames():
                 largest_contour = max(contours, key=cv2.contourArea)
                 area = cv2.contourArea(largest_contour)
 
-                if area > min_contour_area and not resetting:  # Only track if not resetting
+                if area > min_contour_area * scale * scale and not resetting:  # Only track if not resetting
                     # Draw bounding box and centroid
                     x, y, w, h = cv2.boundingRect(largest_contour)
                     center_x = x + w // 2
+                    target = Detection(x, y, w, h, center_x, y + h // 2, area)
                     cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
                     cv2.circle(frame, (center_x, y + h // 2), 5, (0, 255, 0), -1)
 
                     # Adjust motor based on center_x position
-                    distance_from_center = abs(center_x - center_x_target)
-                    if center_x < center_x_target - center_tolerance:
-                        print("Moving left to center")
+                    distance_from_center = abs(center_x - target_x) / scale  # Step delay is tuned in 320-wide pixels
+                    if center_x < target_x - tolerance:
+                        event = telemetry.MOVING_LEFT
                         start_motor(GPIO.LOW, distance_from_center)  # Move left to center
-                    elif center_x > center_x_target + center_tolerance:
-                        print("Moving right to center")
+                    elif center_x > target_x + tolerance:
+                        event = telemetry.MOVING_RIGHT
                         start_motor(GPIO.HIGH, distance_from_center)  # Move right to center
                     else:
-                        print("Centered; motor stopped")
+                        event = telemetry.CENTERED
                         stop_motor()  # Stop motor if within tolerance range
+                    log_record(event, seq, target, error=center_x - target_x, limits=limit_bits())
                 else:
                     stop_motor()  # Stop motor if contour area is too small
+                    log_record(telemetry.NO_TARGET, seq, limits=limit_bits())
             else:
                 stop_motor()  # Stop motor if no contours found
+                log_record(telemetry.NO_TARGET, seq, limits=limit_bits())
 
             # Overlay mask onto frame for display
             mask_rgb = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR)
@@ -133,6 +167,13 @@ def generate_frames():
             ret, buffer = cv2.imencode('.jpg', combined)
             frame = buffer.tobytes()
 
+            mode = governor.observe(time.time() - started)
+            if mode is not None:
+                print(f"Governor: switching to {mode[0]}x{mode[1]} at {mode[2]} fps")
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, mode[0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, mode[1])
+                cap.set(cv2.CAP_PROP_FPS, mode[2])
+
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
         else:
@@ -167,5 +208,7 @@ if __name__ == "__main__":
     finally:
         # Ensure the motor stops and GPIO is cleaned up
         stop_motor()
+        with log_lock:
+            log.close()
         cap.release()
         GPIO.cleanup()
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+import metrics
+from frame_encoder import parse_variant
+
+MAX_BANDWIDTH = 2_000_000  # Bytes per second for all viewers together (~16 Mbit/s)
+SEND_BUFFER_LIMIT = 64 * 1024  # A viewer with more than this still unsent skips frames until it catches up
+ENCODE_WORKERS = 2  # Threads for JPEG encoding, so it never runs on the event loop
+MAX_REQUEST_HEAD = 8192
+
+
+class TokenBucket:
+    """
+    Caps a byte rate: `rate` tokens per second, with up to `burst` saved up.
+
+    Only used from the event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self._last = time.monotonic()
+
+    def take(self, amount):
+        """Spends `amount` tokens if there are that many; returns whether it did."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+        if amount > self.tokens:
+            return False
+        self.tokens -= amount
+        return True
+
+
+class AsyncStreamServer:
+    """
+    Serves /video_feed (MJPEG), /status (JSON) and /metrics from one asyncio event loop.
+
+    An alternative to the Flask `app` for many viewers: a viewer costs a
+    coroutine and a socket instead of a thread. Viewers subscribe to the
+    same StreamHub the vision loop publishes to, and the hub wakes the
+    loop through call_soon_threadsafe, so the vision thread never waits
+    on the network. JPEG encoding runs on a small thread pool, and
+    viewers asking for the same variant share one encode as before.
+
+    There are two kinds of flow control, and both drop frames rather than
+    queue them, since a live view only wants the newest frame:
+
+    - Per connection, a viewer whose socket still has more than
+      `send_buffer_limit` bytes unsent skips frames until it drains.
+    - Across all viewers, a token bucket caps the outbound rate at
+      `max_bandwidth` bytes per second.
+
+    Args:
+        hub (StreamHub): Where the vision loop publishes PublishedFrames.
+        status (callable): Returns a dict merged into the /status response.
+        routes (dict): Extra paths, each mapped to a callable that takes the
+            query arguments and returns a dict to send back as JSON.
+    """
+
+    def __init__(self, hub, host='0.0.0.0', port=8080, status=None, routes=None, max_bandwidth=MAX_BANDWIDTH,
+                 send_buffer_limit=SEND_BUFFER_LIMIT, encode_workers=ENCODE_WORKERS):
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.status = status
+        self.routes = dict(routes or {})
+        self.send_buffer_limit = send_buffer_limit
+        self.bandwidth = TokenBucket(max_bandwidth)
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.backpressure_drops = 0  # Frames skipped because a viewer's socket was full
+        self.bandwidth_drops = 0  # Frames skipped to stay under max_bandwidth
+        self.connections = 0
+        self._encoder = ThreadPoolExecutor(encode_workers, thread_name_prefix="stream-encode")
+        self._loop = None
+        self._published = None  # Set, then replaced, on every hub publish
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        """Runs the server on the calling thread until stop() is called."""
+        asyncio.run(self._serve())
+
+    def stop(self):
+        """Stops the server; safe to call from any thread."""
+        self._stopped.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def stats(self):
+        return {
+            'connections': self.connections,
+            'bytes_sent': self.bytes_sent,
+            'frames_sent': self.frames_sent,
+            'backpressure_drops': self.backpressure_drops,
+            'bandwidth_drops': self.bandwidth_drops,
+            'max_bandwidth': self.bandwidth.rate,
+        }
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._published = asyncio.Event()
+        notify = lambda: self._loop.call_soon_threadsafe(self._wake)
+        self.hub.add_listener(notify)
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        try:
+            async with server:
+                while not self._stopped.is_set():
+                    event = self._published
+                    await event.wait()
+        finally:
+            self.hub.remove_listener(notify)
+            self._encoder.shutdown(wait=False)
+
+    def _wake(self):
+        event, self._published = self._published, asyncio.Event()
+        event.set()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        try:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                return
+            if len(head) > MAX_REQUEST_HEAD:
+                return
+            method, target = head.split(b' ', 2)[:2]
+            url = urlsplit(target.decode('latin-1'))
+            args = dict(parse_qsl(url.query))
+            if method not in (b'GET', b'POST'):
+                await self._respond(writer, '405 Method Not Allowed', 'text/plain', b'Method not allowed\n')
+            elif url.path == '/video_feed':
+                await self._stream(writer, *parse_variant(args))
+            elif url.path == '/status':
+                await self._respond(writer, '200 OK', 'application/json', self._status_json())
+            elif url.path in self.routes:
+                body = json.dumps(self.routes[url.path](args), default=str).encode()
+                await self._respond(writer, '200 OK', 'application/json', body)
+            elif url.path == '/metrics':
+                await self._respond(writer, '200 OK', 'text/plain; version=0.0.4', metrics.render().encode())
+            else:
+                await self._respond(writer, '404 Not Found', 'text/plain', b'Not found\n')
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    def _status_json(self):
+        status = {'stream': self.stats(), 'hub': self.hub.stats()}
+        if self.status is not None:
+            status.update(self.status())
+        return json.dumps(status, default=str).encode()
+
+    async def _stream(self, writer, quality, scale, view):
+        # e.g. /video_feed?quality=50&scale=0.5&view=split, same as the Flask route
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: close\r\n\r\n')
+        transport = writer.transport
+        with self.hub.subscribe() as client:
+            while not self._stopped.is_set() and not transport.is_closing():
+                event = self._published
+                latest = client.next_frame(timeout=0)
+                if latest is None:
+                    if self.hub.closed:
+                        break
+                    await event.wait()
+                    continue
+                if transport.get_write_buffer_size() > self.send_buffer_limit:
+                    self.backpressure_drops += 1
+                    continue
+                data = await self._loop.run_in_executor(self._encoder, latest[1].jpeg, quality, scale, view)
+                if data is None:
+                    continue
+                if not self.bandwidth.take(len(data)):
+                    self.bandwidth_drops += 1
+                    continue
+                writer.writelines((b'--frame\r\nContent-Type: image/jpeg\r\n\r\n', data, b'\r\n\r\n'))
+                self.bytes_sent += len(data)
+                self.frames_sent += 1
@@ -1,104 +1,281 @@
 import cv2
-import numpy as np
-from flask import Flask, Response
+from flask import Flask, Response, jsonify, request
+import os
 import threading
 import time
 import pygame
-from motor_control import setup_motor_gpio, move_motor, cleanup_motor_gpio
+import metrics
+import motor_control
+import realtime
+import startup_trace
+from async_stream import AsyncStreamServer
+from capture_governor import CaptureGovernor
+from flight_recorder import FlightRecorder
+from frame_encoder import DEFAULT_QUALITY, DEFAULT_SCALE, DEFAULT_VIEW, PublishPool, parse_variant
+from frame_grabber import FrameGrabber
+from stream_hub import StreamHub
+from telemetry import CAPTURE_FAILED, FRAME, TelemetryWriter, session_path
+from pan_controller import PanController
+from vision_pipeline import VisionPipeline
+from motor_control import setup_motor_gpio, cleanup_motor_gpio, home_motor
 
 
 # Flask setup
 app = Flask(__name__)
 
-# Video setup
-cap = cv2.VideoCapture(0)
-if not cap.isOpened():
-    print("Error: Could not open video device")
-    cleanup_motor_gpio()
-    exit()
-
-# Set lower resolution for processing load
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, 320)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 240)
-cap.set(cv2.CAP_PROP_FPS, 5)
-
-# HSV color thresholding values for red
-hueLow, hueHigh = 170, 180
-satLow, satHigh = 70, 255
-valLow, valHigh = 50, 255
-min_contour_area = 500
-frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-frame_center_x = frame_width // 2
-K_p = 0.05
-
-current_frame = None
+# Video setup; lower resolution for processing load. This is where capture
+# starts; the governor then moves it up or down with the CPU headroom
+FRAME_WIDTH, FRAME_HEIGHT = 320, 240
+CAMERA_FPS = 5
+GOVERNOR = os.environ.get('ABRS_GOVERNOR', '1') != '0'  # ABRS_GOVERNOR=0 keeps the starting mode
+# 'flask' (thread per viewer) or 'async' (one event loop with per-viewer frame dropping and a bandwidth cap)
+STREAM_SERVER = os.environ.get('ABRS_STREAM_SERVER', 'flask')
+RECORDER = os.environ.get('ABRS_RECORDER', '1') != '0'  # ABRS_RECORDER=0 skips the flight recorder
+TELEMETRY = os.environ.get('ABRS_TELEMETRY', '1') != '0'  # ABRS_TELEMETRY=0 skips the per-frame binary log
+cap = None  # Opened by warm_up() or start_camera_control(), so importing this module leaves the camera free
+
+
+def set_capture_mode(capture, width, height, fps):
+    """Asks the camera for a resolution and frame rate; it may settle on something close instead."""
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    capture.set(cv2.CAP_PROP_FPS, fps)
+
+
+def open_camera(index=0):
+    """Opens the camera at the processing resolution; returns None if it cannot be opened."""
+    capture = cv2.VideoCapture(index)
+    if not capture.isOpened():
+        print("Error: Could not open video device")
+        return None
+    set_capture_mode(capture, FRAME_WIDTH, FRAME_HEIGHT, CAMERA_FPS)
+    return capture
+
+
+_warm_up_threads = []
+
+
+def warm_up(camera_index=0):
+    """
+    Opens the camera and sets up the motor on background threads, e.g. while the menu is showing.
+
+    start_camera_control() picks up whatever is ready and opens the rest itself.
+    """
+    if _warm_up_threads:
+        return
+
+    def open_and_start():
+        global cap
+        with startup_trace.step('camera open'):
+            capture = open_camera(camera_index)
+            if capture is not None:
+                capture.grab()  # Start streaming so exposure settles before tracking begins
+        cap = capture
+
+    def motor():
+        with startup_trace.step('motor setup'):
+            setup_motor_gpio()
+
+    for target, name in ((open_and_start, "camera-warm-up"), (motor, "motor-warm-up")):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        _warm_up_threads.append(thread)
+
+
+hub = StreamHub()  # Hands each encoded frame to every /video_feed viewer
+publish_pool = PublishPool()  # Reused frame and mask copies for what goes to the hub
 stop_panning = False
-step_size = 0
-previous_center_x = frame_center_x  # Initialize with frame center as the starting point
+grabber = None  # FrameGrabber feeding process_video
+# Detection thresholds live in vision_pipeline; the pan motor is steered by a
+# fixed-rate PanController from the pipeline's latest error estimate
+pipeline = VisionPipeline(FRAME_WIDTH, closed_loop=True, frame_height=FRAME_HEIGHT)
+governor = CaptureGovernor(mode=(FRAME_WIDTH, FRAME_HEIGHT, CAMERA_FPS))
+# Last few seconds of frames and tracking state, dumped on Stop, a limit hit or /record
+recorder = FlightRecorder((FRAME_WIDTH, FRAME_HEIGHT)) if RECORDER else None
+pan = None  # PanController, running while camera control is active
+tilt = None  # PanController on the tilt axis, when the engine has one
+
+# Instrumentation for /metrics; ABRS_METRICS=0 switches the stage timers off
+capture_stage = metrics.stage('capture', "Waiting for the next camera frame")
+publish_stage = metrics.stage('publish', "Handing the frame to stream viewers")
+vision_rate = metrics.rate('vision', "Frames processed by the vision loop")
+# A frame is late if it is still being processed when the camera's next one is due
+vision_deadlines = realtime.DeadlineMonitor('vision')
+metrics.register_value('frames_captured_total', lambda: grabber and grabber.captured,
+                       "Frames read from the camera", kind='counter')
+metrics.register_value('frames_dropped_total', lambda: grabber and grabber.dropped,
+                       "Frames replaced before the vision loop read them", kind='counter')
+metrics.register_value('steps_issued_total', lambda: motor_control.engine and motor_control.engine.steps_issued,
+                       "Step pulses issued by the motion engine", kind='counter')
+metrics.register_value('motion_deadline_misses_total', lambda: motor_control.engine and motor_control.engine.late_pulses,
+                       "Step pulses that went out more than MAX_LATENESS after their deadline", kind='counter')
+metrics.register_value('motion_max_lateness_seconds', lambda: motor_control.engine and motor_control.engine.max_lateness,
+                       "Worst lateness of a step pulse against its deadline")
+metrics.register_value('limit_hits_total', lambda: motor_control.engine and motor_control.engine.limit_hits,
+                       "Times a pan limit switch closed, homing included", kind='counter')
+metrics.register_value('capture_width', lambda: governor.mode[0], "Capture width the governor has chosen")
+metrics.register_value('capture_fps', lambda: governor.mode[2], "Capture frame rate the governor has chosen")
+metrics.register_value('capture_load_seconds', lambda: governor.load,
+                       "90th percentile frame processing time over the governor's last window")
+metrics.register_value('soc_temperature_celsius', lambda: governor.temperature, "SoC temperature at the last check")
+metrics.register_value('capture_step_downs_total', lambda: governor.step_downs,
+                       "Times the governor lowered the capture mode", kind='counter')
+metrics.register_value('motion_gate_hits_total', lambda: pipeline.gate and pipeline.gate.hits,
+                       "Frames the motion gate let skip detection", kind='counter')
+metrics.register_value('motion_gate_hit_ratio', lambda: pipeline.gate and pipeline.gate.hit_rate,
+                       "Share of frames the motion gate let skip detection")
+metrics.register_value('motion_gate_saved_seconds_total', lambda: pipeline.gate and pipeline.gate.saved,
+                       "Estimated detection CPU time the motion gate saved", kind='counter')
+metrics.register_value('stream_viewers', lambda: hub.subscriber_count, "Connected /video_feed viewers")
 
 def process_video():
-    global current_frame, stop_panning, step_size, previous_center_x
+    global stop_panning, grabber
+    realtime.pin_thread(realtime.VISION_CPUS)
+    realtime.configure_opencv()
+    grabber = FrameGrabber(cap).start()
+    hub.reopen()
+    last_seq = -1
+    tracked = False
+    engine = motor_control.engine
+    limit_hits = engine.limit_hits if engine else 0
+    log = TelemetryWriter(session_path()) if TELEMETRY else None
     while cap.isOpened() and not stop_panning:
-        success, frame = cap.read()
-        if success:
-            frameHSV = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-            lowerBound = np.array([hueLow, satLow, valLow])
-            upperBound = np.array([hueHigh, satHigh, valHigh])
-            myMask = cv2.inRange(frameHSV, lowerBound, upperBound)
-
-            contours, _ = cv2.findContours(myMask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                largest_contour = max(contours, key=cv2.contourArea)
-                area = cv2.contourArea(largest_contour)
-
-                if area > min_contour_area:
-                    x, y, w, h = cv2.boundingRect(largest_contour)
-                    center_x = x + w // 2
-                    offset_x = center_x - frame_center_x
-                    step_size = int(K_p * abs(offset_x))
-
-                    # Determine movement direction
-                    if center_x < previous_center_x:  # Object moved left
-                        move_motor(step_size, 'L')
-                    elif center_x > previous_center_x:  # Object moved right
-                        move_motor(step_size, 'R')
-
-                    # Draw the bounding box and center point
-                    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
-                    cv2.circle(frame, (center_x, y + h // 2), 5, (0, 255, 0), -1)
-
-                    # Update previous center position
-                    previous_center_x = center_x
-
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 20])
-            if not ret:
-                print("Error: Frame encoding failed")
-            else:
-                current_frame = buffer.tobytes()
-        else:
+        # Always work on the newest frame; anything older has been dropped
+        with capture_stage:
+            latest = grabber.read(last_seq, timeout=1.0)
+        if latest is None:
+            if grabber.running:
+                continue
+            if log is not None:
+                log.record(CAPTURE_FAILED, last_seq, engine=engine)
+            print("Error: Video capture stopped")
             break
-
+        last_seq, frame_time, frame = latest
+        started = time.perf_counter()
+        height, width = frame.shape[:2]
+        if width != pipeline.frame_center_x * 2 or height != pipeline.frame_center_y * 2:
+            pipeline.set_frame_size(width, height)  # The capture mode changed
+        target = pipeline.process(frame, frame_time)
+        if target is not None and not tracked:
+            tracked = True
+            startup_trace.mark(startup_trace.FIRST_TRACK)
+
+        # Drawing and JPEG encoding happen lazily in the viewers' threads,
+        # and only when somebody is watching
+        if hub.subscriber_count:
+            with publish_stage:
+                hub.publish(publish_pool.publish(frame, target, pipeline.detector))
+        if recorder is not None:
+            recorder.record(frame, frame_time, last_seq, target, engine, pan.velocity if pan else 0.0)
+            if engine is not None and engine.limit_hits != limit_hits:
+                limit_hits = engine.limit_hits
+                recorder.trigger('limit')
+        if log is not None:
+            log.record(FRAME, last_seq, target, pan.error if pan else None, pan.velocity if pan else 0.0,
+                       engine=engine, timestamp=frame_time)
+        vision_rate.tick()
+        vision_deadlines.observe(time.monotonic() - frame_time - 1.0 / governor.mode[2])
+
+        mode = governor.observe(time.perf_counter() - started) if GOVERNOR else None
+        if mode is not None:
+            # The capture thread must not read while the camera is reconfigured
+            print(f"Capture governor: switching to {mode[0]}x{mode[1]} at {mode[2]} fps "
+                  f"(p90 {governor.load * 1000:.1f} ms, {governor.temperature or 0:.0f} C)")
+            grabber.stop()
+            set_capture_mode(cap, *mode)
+            grabber.start()
+
+    grabber.stop()
+    hub.close()
+    if log is not None:
+        log.close()
+    print(f"Capture stats: {grabber.stats()}, deadlines: {deadline_stats()}")
     stop_panning = False
 
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
-
-def gen():
-    global current_frame
-    time.sleep(2)
-    while not stop_panning:
-        if current_frame is not None:
+    # e.g. /video_feed?quality=50&scale=0.5&view=split (views: overlay, raw, mask, split)
+    quality, scale, view = parse_variant(request.args)
+    return Response(gen(quality, scale, view), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+def gen(quality=DEFAULT_QUALITY, scale=DEFAULT_SCALE, view=DEFAULT_VIEW):
+    # Blocks until the vision loop publishes a newer frame; a slow viewer skips ahead.
+    # Viewers asking for the same variant share a single encode of each frame.
+    with hub.subscribe() as client:
+        while not stop_panning:
+            latest = client.next_frame(timeout=1.0)
+            if latest is None:
+                if hub.closed:
+                    break
+                continue
+            frame = latest[1].jpeg(quality, scale, view)
+            if frame is None:
+                continue
             yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + current_frame + b'\r\n\r\n')
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n\r\n')
+
+def status():
+    """Returns the live tracking state as a dict, for the /status endpoint."""
+    engine = motor_control.engine
+    return {
+        'pan_velocity': pan.velocity if pan else 0.0,
+        'tilt_velocity': tilt.velocity if tilt else 0.0,
+        'position': engine.position if engine else None,
+        'tilt_position': engine.tilt_position if engine and engine.has_tilt else None,
+        'steps_issued': engine.steps_issued if engine else None,
+        'capture_mode': governor.mode,
+        'capture_load_seconds': governor.load,
+        'vision_hz': vision_rate.rate(),
+        'stream_viewers': hub.subscriber_count,
+        'deadlines': deadline_stats(),
+    }
+
+def deadline_stats():
+    """Deadline misses and worst lateness, in seconds, of each real-time loop."""
+    engine = motor_control.engine
+    stats = {'vision': vision_deadlines.stats()}
+    if engine is not None:
+        stats['motion'] = {'misses': engine.late_pulses, 'max_lateness': engine.max_lateness}
+    for controller in (pan, tilt):
+        if controller is not None and hasattr(controller, 'deadlines'):
+            stats[f'{controller.axis}_control'] = controller.deadlines.stats()
+    return stats
+
+@app.route('/status')
+def status_endpoint():
+    return status()
+
+def record(args=None):
+    """Dumps the flight recorder; returns a dict saying where to, for the /record endpoint."""
+    path = recorder.trigger(args.get('reason', 'http') if args else 'http') if recorder else None
+    return {'recording': path, 'busy': path is None and recorder is not None and recorder.count > 0}
+
+@app.route('/record', methods=['GET', 'POST'])
+def record_endpoint():
+    return jsonify(record(request.args))
+
+def serve(port=8080):
+    """Runs the streaming server picked by STREAM_SERVER on this thread; blocks."""
+    if STREAM_SERVER == 'async':
+        server = AsyncStreamServer(hub, port=port, status=status, routes={'/record': record})
+        metrics.register_value('stream_bytes_sent_total', lambda: server.bytes_sent,
+                               "JPEG bytes sent to /video_feed viewers", kind='counter')
+        metrics.register_value('stream_frames_dropped_total', lambda: server.backpressure_drops + server.bandwidth_drops,
+                               "Frames skipped for a full socket or the bandwidth cap", kind='counter')
+        server.serve_forever()
+    else:
+        app.run(host='0.0.0.0', port=port, threaded=True)
 
 def display_stop_button():
-    """Displays a Pygame window with a Stop button during camera control, along with the step size."""
-    global stop_panning, step_size
+    """Displays a Pygame window with a Stop button during camera control, along with the pan speed."""
+    global stop_panning
     pygame.init()
     screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
     pygame.display.set_caption('Camera Control')
-    clock = pygame.time.Clock()
 
     # Colors
     background_color = (0, 0, 0)  # Dark grey background
@@ -106,7 +283,7 @@ def display_stop_button():
     button_hover_color = (200, 0, 0)  # Darker red for hover
     text_color = (255, 255, 255)  # White for text
     step_size_color = (0, 255, 0)  # Green for step size text
-    
+    speed_refresh_ms = 100  # How often the speed readout is checked when there is no input
 
     # Fonts
     font = pygame.font.Font(pygame.font.match_font('arial'), 24)
@@ -114,44 +291,87 @@ def display_stop_button():
     # Stop button properties
     button_radius = 60
     button_center = (540, 80)  # x, y coordinates for button center
+    button_rect = pygame.Rect(0, 0, 2 * button_radius, 2 * button_radius)
+    button_rect.center = button_center
+    stop_text = font.render('Stop', True, text_color)  # Never changes, so render it once
+    stop_text_rect = stop_text.get_rect(center=button_center)
 
-    running = True
-    while running:
-        screen.fill(background_color)  # Fill screen with background color
-
-        # Draw stop button
-        mouse_pos = pygame.mouse.get_pos()
-        button_color_to_use = button_hover_color if (mouse_pos[0] - button_center[0]) ** 2 + (mouse_pos[1] - button_center[1]) ** 2 < button_radius ** 2 else button_color
-        pygame.draw.circle(screen, button_color_to_use, button_center, button_radius)
+    def on_button(pos):
+        return (pos[0] - button_center[0]) ** 2 + (pos[1] - button_center[1]) ** 2 < button_radius ** 2
 
-        # Draw stop text on button
-        stop_text = font.render('Stop', True, text_color)
-        stop_text_rect = stop_text.get_rect(center=button_center)
-        screen.blit(stop_text, stop_text_rect)
+    screen.fill(background_color)
+    pygame.display.update()
+    hovered = None
+    speed_label = None
+    speed_rect = None
 
-        # Display step size on the screen
-        step_size_text = font.render(f'Step Size: {step_size}', True, step_size_color)
-        step_size_rect = step_size_text.get_rect(center=(320, 240))
-        screen.blit(step_size_text, step_size_rect)
+    running = True
+    while running:
+        # Sleep until there is input, waking up now and then for the speed readout
+        event = pygame.event.wait(speed_refresh_ms)
+        events = pygame.event.get()
+        if event.type != pygame.NOEVENT:
+            events.insert(0, event)
 
         # Event handling
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 running = False
                 stop_panning = True
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                if (mouse_pos[0] - button_center[0]) ** 2 + (mouse_pos[1] - button_center[1]) ** 2 < button_radius ** 2:
+                if on_button(event.pos):
                     print("Stop button clicked, exiting...")
+                    if recorder is not None:
+                        recorder.trigger('stop')
                     running = False
                     stop_panning = True
 
-        pygame.display.update()
-        clock.tick(30)  # Limit the frame rate to 30 FPS
+        # Redraw only what changed: the button on hover, the speed text when its value does
+        dirty = []
+        hover = on_button(pygame.mouse.get_pos())
+        if hover != hovered:
+            hovered = hover
+            pygame.draw.circle(screen, button_hover_color if hover else button_color, button_center, button_radius)
+            screen.blit(stop_text, stop_text_rect)
+            dirty.append(button_rect)
+
+        label = f'Speed: {pan.velocity if pan else 0:.0f} steps/s'
+        if label != speed_label:
+            speed_label = label
+            if speed_rect is not None:
+                screen.fill(background_color, speed_rect)
+                dirty.append(speed_rect)
+            step_size_text = font.render(label, True, step_size_color)
+            speed_rect = step_size_text.get_rect(center=(320, 240))
+            screen.blit(step_size_text, speed_rect)
+            dirty.append(speed_rect)
+
+        if dirty:
+            pygame.display.update(dirty)
 
     pygame.quit()
 
 def start_camera_control():
-    setup_motor_gpio()
+    global pan, tilt, cap, pipeline
+    for thread in _warm_up_threads:
+        thread.join()
+    if cap is None or not cap.isOpened():
+        cap = open_camera()
+    if cap is None:
+        cleanup_motor_gpio()
+        return
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    if frame_width != pipeline.frame_center_x * 2 or frame_height != pipeline.frame_center_y * 2:
+        # The camera did not take the requested size
+        pipeline = VisionPipeline(frame_width, closed_loop=True, frame_height=frame_height)
+    engine = setup_motor_gpio()
+    if not engine.homed:
+        home_motor()
+    pan = PanController(engine, pipeline.pan_error, feedforward=pipeline.pan_feedforward).start()
+    if engine.has_tilt:
+        tilt = PanController(engine, pipeline.tilt_error, feedforward=pipeline.tilt_feedforward, axis='tilt').start()
+
     # Start the video processing in a separate thread
     video_thread = threading.Thread(target=process_video)
     video_thread.daemon = True
@@ -166,6 +386,9 @@ def start_camera_control():
     video_thread.join()
     button_thread.join()
 
+    pan.stop()
+    if tilt is not None:
+        tilt.stop()
     cap.release()
     cleanup_motor_gpio()
 
@@ -175,7 +398,8 @@ if __name__ == "__main__":
         control_thread = threading.Thread(target=start_camera_control)
         control_thread.daemon = True
         control_thread.start()
-        app.run(host='0.0.0.0', port=8080, threaded=True)
+        serve(8080)
     finally:
-        cap.release()
+        if cap is not None:
+            cap.release()
         cleanup_motor_gpio()
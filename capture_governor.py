@@ -0,0 +1,119 @@
+import time
+from collections import deque
+
+# Capture modes the governor moves between, cheapest first: (width, height, fps)
+MODES = ((160, 120, 5), (320, 240, 5), (320, 240, 10), (640, 480, 10), (640, 480, 15))
+DEFAULT_MODE = (320, 240, 5)
+LATENCY_BUDGET = 0.08  # Seconds a frame may take to process, however slow the frame rate
+HEADROOM = 0.6  # Step up only if the next mode is predicted to use at most this share of its budget
+WINDOW = 30  # Frames measured per decision
+HOLD_SECONDS = 5.0  # Minimum time between changes, so the camera settles before the new mode is judged
+THROTTLE_TEMP = 80.0  # Degrees C; the Pi firmware starts soft throttling here
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+THROTTLED_FILE = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+THROTTLED_NOW = 0xE  # get_throttled bits: frequency capped, throttled, soft temperature limit
+
+
+def read_temperature(path=THERMAL_ZONE):
+    """Returns the SoC temperature in degrees C, or None where there is no thermal zone."""
+    try:
+        with open(path) as f:
+            return int(f.read()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+def read_throttled(path=THROTTLED_FILE):
+    """Returns True while the Pi firmware reports throttling now, None where it cannot be read."""
+    try:
+        with open(path) as f:
+            return bool(int(f.read(), 16) & THROTTLED_NOW)
+    except (OSError, ValueError):
+        return None
+
+
+class CaptureGovernor:
+    """
+    Picks the capture resolution and frame rate from how long frames take to process.
+
+    Every `window` frames the 90th percentile processing time is compared
+    with the frame budget: LATENCY_BUDGET, or the frame period if that is
+    shorter. Over budget, or while the Pi is throttling or running hot,
+    the governor steps down one mode. When the cost scaled to the next
+    mode's pixel count still fits within `headroom` of that mode's
+    budget, it steps up one. After a change it holds for `hold` seconds.
+
+    observe() returns the new (width, height, fps) when the mode changes;
+    applying it to the camera is up to the caller.
+    """
+
+    def __init__(self, modes=MODES, mode=DEFAULT_MODE, budget=LATENCY_BUDGET, headroom=HEADROOM,
+                 window=WINDOW, hold=HOLD_SECONDS, throttle_temp=THROTTLE_TEMP):
+        self.modes = tuple(modes)
+        self.index = self.modes.index(tuple(mode))
+        self.budget = budget
+        self.headroom = headroom
+        self.hold = hold
+        self.throttle_temp = throttle_temp
+        self.load = 0.0  # 90th percentile processing time of the last window
+        self.temperature = None
+        self.step_ups = 0
+        self.step_downs = 0
+        self._times = deque(maxlen=window)
+        self._changed = None  # When the mode last changed
+
+    @property
+    def mode(self):
+        return self.modes[self.index]
+
+    def frame_budget(self, mode=None):
+        """Returns the seconds of processing a frame may take in `mode` (default: the current one)."""
+        fps = (mode or self.mode)[2]
+        return min(self.budget, 1.0 / fps)
+
+    def throttled(self):
+        """True while the Pi is throttling or at or above `throttle_temp`."""
+        self.temperature = read_temperature()
+        if read_throttled():
+            return True
+        return self.temperature is not None and self.temperature >= self.throttle_temp
+
+    def observe(self, seconds, now=None):
+        """
+        Records how long one frame took to process.
+
+        Args:
+            seconds (float): Processing time of the frame, capture excluded.
+            now (float): time.monotonic() seconds; defaults to now.
+
+        Returns:
+            tuple: The new (width, height, fps) if the mode changed, else None.
+        """
+        self._times.append(seconds)
+        if len(self._times) < self._times.maxlen:
+            return None
+        if now is None:
+            now = time.monotonic()
+        times = sorted(self._times)
+        self._times.clear()
+        self.load = times[int(0.9 * (len(times) - 1))]
+        if self._changed is not None and now - self._changed < self.hold:
+            return None
+
+        hot = self.throttled()
+        if self.index > 0 and (hot or self.load > self.frame_budget()):
+            self.step_downs += 1
+            return self._switch(self.index - 1, now)
+        if self.index + 1 < len(self.modes) and not hot:
+            width, height, _ = self.mode
+            next_mode = self.modes[self.index + 1]
+            predicted = self.load * (next_mode[0] * next_mode[1]) / (width * height)
+            if predicted <= self.headroom * self.frame_budget(next_mode):
+                self.step_ups += 1
+                return self._switch(self.index + 1, now)
+        return None
+
+    def _switch(self, index, now):
+        self.index = index
+        self._changed = now
+        return self.mode
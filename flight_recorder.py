@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+RECORD_SECONDS = 10.0  # How much history a dump covers
+MAX_FPS = 15  # Highest frame rate the ring must hold RECORD_SECONDS of
+RECORD_DIR = os.environ.get('ABRS_RECORD_DIR', 'recordings')
+JPEG_QUALITY = 90
+
+# Tracking state kept alongside each recorded frame
+STATE_DTYPE = np.dtype([
+    ('seq', 'i8'),
+    ('time', 'f8'),  # Capture time, time.monotonic() seconds
+    ('detected', 'u1'),
+    ('x', 'i4'), ('y', 'i4'), ('w', 'i4'), ('h', 'i4'),
+    ('center_x', 'f4'), ('center_y', 'f4'),
+    ('area', 'f4'),
+    ('position', 'i4'),  # Pan position in steps from the left limit
+    ('tilt_position', 'i4'),
+    ('steps_issued', 'i8'),
+    ('velocity', 'f4'),  # Commanded pan velocity, steps per second
+])
+
+
+class FlightRecorder:
+    """
+    Keeps the last few seconds of frames and tracking state, ready to dump when something goes wrong.
+
+    Frames are resized straight into a preallocated ring and the state goes
+    into a preallocated structured array, so record() allocates nothing per
+    frame. trigger() only picks which slots hold the newest `seconds`; a
+    background thread then copies and JPEG-encodes them one at a time,
+    oldest first, so the vision loop pays almost nothing for a dump. Slots
+    the ring has overwritten by the time the writer reaches them are
+    skipped, and counted in the dump's meta.
+
+    A dump is an .npz file: `jpeg` (every frame's JPEG bytes, concatenated),
+    `offsets` (where each frame starts and ends in `jpeg`), `state` (one
+    STATE_DTYPE row per frame) and `meta` (JSON). read_recording() and
+    BENCH-replay read it back.
+    """
+
+    def __init__(self, size=(320, 240), seconds=RECORD_SECONDS, max_fps=MAX_FPS, directory=RECORD_DIR):
+        self.size = tuple(size)  # (width, height) frames are stored at
+        self.seconds = seconds
+        self.directory = directory
+        self.capacity = int(np.ceil(seconds * max_fps))
+        width, height = self.size
+        self.frames = np.zeros((self.capacity, height, width, 3), dtype=np.uint8)
+        self.state = np.zeros(self.capacity, dtype=STATE_DTYPE)
+        self.recorded = np.full(self.capacity, -1, dtype=np.int64)  # Which record (count) each slot holds
+        self.count = 0  # Frames recorded so far
+        self.dumps = 0
+        self.last_dump = None  # Path of the last finished dump
+        self._lock = threading.Lock()
+        self._writer = None
+
+    def record(self, frame, frame_time, seq, target=None, engine=None, velocity=0.0):
+        """
+        Stores one frame and the tracking state that goes with it.
+
+        Args:
+            frame: BGR frame; resized to the recorder's size if needed.
+            frame_time (float): Capture time in time.monotonic() seconds.
+            seq (int): Frame sequence number.
+            target: Detection for the frame, or None.
+            engine: MotionEngine to read positions and step counts from.
+            velocity (float): Commanded pan velocity.
+        """
+        with self._lock:
+            index = self.count % self.capacity
+            slot = self.frames[index]
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, self.size, dst=slot, interpolation=cv2.INTER_AREA)
+            row = self.state[index]
+            row['seq'] = seq
+            row['time'] = frame_time
+            row['velocity'] = velocity
+            if target is None:
+                row['detected'] = 0
+            else:
+                row['detected'] = 1
+                scale = self.size[0] / frame.shape[1]  # Keep coordinates in the stored frame's pixels
+                row['x'] = target.x * scale
+                row['y'] = target.y * scale
+                row['w'] = target.w * scale
+                row['h'] = target.h * scale
+                row['center_x'] = target.center_x * scale
+                row['center_y'] = target.center_y * scale
+                row['area'] = target.area * scale * scale
+            if engine is not None:
+                row['position'] = engine.position
+                row['tilt_position'] = engine.tilt_position
+                row['steps_issued'] = engine.steps_issued
+            self.recorded[index] = self.count
+            self.count += 1
+
+    def trigger(self, reason):
+        """
+        Dumps the last `seconds` of recording to disk on a background thread.
+
+        Returns the path being written, or None if there is nothing recorded
+        yet or the previous dump is still being written.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f'flight-{stamp}-{reason}.npz')
+        meta = {'reason': reason, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'width': self.size[0],
+                'height': self.size[1]}
+        with self._lock:
+            # Two triggers at once (e.g. a limit hit and an operator dump) must not both start a writer
+            if self._writer is not None and self._writer.is_alive():
+                return None
+            stored = min(self.count, self.capacity)
+            if not stored:
+                return None
+            # Oldest to newest, limited to the last `seconds`; only record numbers are
+            # taken here, the frames are copied by the writer thread
+            records = np.arange(self.count - stored, self.count)
+            order = records % self.capacity
+            records = records[self.state['time'][order] >= self.state['time'][order[-1]] - self.seconds]
+            self._writer = threading.Thread(target=self._write, args=(path, records, meta), name="flight-dump",
+                                            daemon=True)
+            self._writer.start()  # It takes the lock per frame, so it starts copying once this returns
+        return path
+
+    def wait(self, timeout=None):
+        """Waits for a dump in progress to finish."""
+        if self._writer is not None:
+            self._writer.join(timeout)
+
+    def _write(self, path, records, meta):
+        start = time.perf_counter()
+        frame = np.empty_like(self.frames[0])
+        state = np.zeros(len(records), dtype=STATE_DTYPE)
+        encoded = []
+        for record in records:
+            index = record % self.capacity
+            with self._lock:
+                if self.recorded[index] != record:
+                    continue  # Overwritten since trigger()
+                np.copyto(frame, self.frames[index])
+                state[len(encoded)] = self.state[index]
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            encoded.append(buffer.ravel() if ret else np.zeros(0, dtype=np.uint8))
+        state = state[:len(encoded)]
+        meta['frames'] = len(encoded)
+        meta['skipped'] = len(records) - len(encoded)
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        times = state['time']
+        meta['fps'] = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        # Write under a temporary name so a reader never sees half a file
+        temporary = path + '.part'
+        jpeg = np.concatenate(encoded) if encoded else np.zeros(0, dtype=np.uint8)
+        with open(temporary, 'wb') as f:
+            np.savez(f, jpeg=jpeg, offsets=offsets, state=state, meta=np.array(json.dumps(meta)))
+        os.replace(temporary, path)
+        self.dumps += 1
+        self.last_dump = path
+        print(f"Flight recorder: {meta['frames']} frames ({meta['reason']}) written to {path} "
+              f"in {time.perf_counter() - start:.2f} s")
+
+
+def is_recording(path):
+    return path.endswith('.npz') and os.path.isfile(path)
+
+
+def read_recording(path):
+    """
+    Reads a FlightRecorder dump.
+
+    Returns:
+        tuple: (meta dict, state array, generator of decoded BGR frames in order).
+    """
+    data = np.load(path)
+    meta = json.loads(str(data['meta']))
+    jpeg, offsets = data['jpeg'], data['offsets']
+
+    def frames():
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            yield cv2.imdecode(jpeg[start:end], cv2.IMREAD_COLOR)
+
+    return meta, data['state'], frames()
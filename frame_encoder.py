@@ -0,0 +1,193 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Views a /video_feed client can ask for
+VIEWS = ('overlay', 'raw', 'mask', 'split')
+DEFAULT_QUALITY = 20
+DEFAULT_SCALE = 1.0
+DEFAULT_VIEW = 'overlay'
+
+# Encodes run on viewer threads, so this timer is fed with observe() instead of `with`
+encode_stage = metrics.stage('encode', "JPEG encode of one stream variant")
+
+
+def parse_variant(args):
+    """
+    Reads (quality, scale, view) from request query parameters.
+
+    Out-of-range or malformed values fall back to the defaults so a bad URL
+    still gets a stream.
+    """
+    try:
+        quality = min(100, max(1, int(args.get('quality', DEFAULT_QUALITY))))
+    except ValueError:
+        quality = DEFAULT_QUALITY
+    try:
+        scale = min(1.0, max(0.1, float(args.get('scale', DEFAULT_SCALE))))
+    except ValueError:
+        scale = DEFAULT_SCALE
+    view = args.get('view', DEFAULT_VIEW)
+    if view not in VIEWS:
+        view = DEFAULT_VIEW
+    return quality, round(scale, 2), view
+
+
+def draw_target(frame, target):
+    """Draws the bounding box and center point of a Detection onto a frame."""
+    x, y, w, h = target.x, target.y, target.w, target.h
+    cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 0, 255), 2)
+    cv2.circle(frame, (int(round(target.center_x)), int(round(target.center_y))), 5, (0, 255, 0), -1)
+
+
+class PublishedFrame:
+    """
+    One processed frame as handed to stream viewers, encoded on demand.
+
+    Nothing is drawn or encoded until a viewer asks for a variant
+    (quality, scale, view). Each variant is encoded at most once and then
+    shared by every viewer asking for the same one. Variants live only as
+    long as the frame: once a newer frame is published this one, and every
+    variant cached on it, is dropped. A variant is a memoryview on the
+    encoder's output buffer, never copied into a bytes object.
+
+    A frame backed by a PublishPool slot pins the slot while it encodes;
+    if the slot was already reused by the time a viewer gets to it, jpeg()
+    returns None rather than encode another frame's pixels.
+    """
+
+    def __init__(self, frame, target=None, mask=None, pool=None, slot=None, generation=None):
+        self.frame = frame
+        self.target = target
+        self.mask = mask
+        self.pool = pool
+        self.slot = slot
+        self.generation = generation
+        self.encodes = 0
+        self._variants = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def jpeg(self, quality=DEFAULT_QUALITY, scale=DEFAULT_SCALE, view=DEFAULT_VIEW):
+        """
+        Returns the JPEG data for a variant as a read-only memoryview.
+
+        None means encoding failed, or the pool slot holding the frame has
+        since been reused; the viewer should wait for the next frame.
+        """
+        key = (quality, scale, view)
+        data = self._variants.get(key)
+        if data is not None:
+            return data
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:  # Viewers asking for the same variant wait for one encode
+            data = self._variants.get(key)
+            if data is None:
+                if self.pool is not None and not self.pool.pin(self.slot, self.generation):
+                    return None  # Overwritten by a newer publish before this viewer got to it
+                try:
+                    start = time.perf_counter() if metrics.enabled else 0.0
+                    ret, buffer = cv2.imencode('.jpg', self._render(scale, view),
+                                               [cv2.IMWRITE_JPEG_QUALITY, quality])
+                    if start:
+                        encode_stage.observe(time.perf_counter() - start)
+                finally:
+                    if self.pool is not None:
+                        self.pool.unpin(self.slot)
+                if not ret:
+                    print("Error: Frame encoding failed")
+                    return None
+                buffer = buffer.reshape(-1)
+                buffer.flags.writeable = False
+                data = memoryview(buffer)
+                self._variants[key] = data
+                self.encodes += 1
+        return data
+
+    def _render(self, scale, view):
+        if view == 'mask':
+            image = self._mask_image()
+        else:
+            image = self.frame
+            if view != 'raw' and self.target is not None:
+                image = image.copy()  # Keep the published frame clean for 'raw' viewers
+                draw_target(image, self.target)
+            if view == 'split':
+                image = cv2.hconcat([image, cv2.cvtColor(self._mask_image(), cv2.COLOR_GRAY2BGR)])
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        return image
+
+    def _mask_image(self):
+        if self.mask is None:
+            return np.zeros(self.frame.shape[:2], dtype=np.uint8)
+        return self.mask
+
+
+class PublishPool:
+    """
+    Preallocated frame and mask copies for publishing, reused round-robin.
+
+    The vision loop's frame lives in a capture slot that is reused, so a
+    published frame needs its own copy. Instead of allocating one per frame,
+    publish() copies into the next of `slots` buffers (np.copyto, and the
+    mask is pasted straight in by the detector).
+
+    A slot is pinned while a viewer encodes from it, and publish() skips
+    pinned slots, so an encode never sees its pixels change underneath it.
+    Every reuse bumps the slot's generation; a PublishedFrame whose slot
+    has moved on refuses to encode (see PublishedFrame.jpeg) instead of
+    pairing another frame's pixels with its own overlay and mask. If every
+    slot is pinned, publish() falls back to a fresh copy.
+    """
+
+    def __init__(self, slots=4):
+        self.slots = slots
+        self.fallbacks = 0  # Publishes that found every slot pinned
+        self._frames = None
+        self._masks = None
+        self._next = 0
+        self._pins = [0] * slots
+        self._generations = [0] * slots
+        self._lock = threading.Lock()
+
+    def publish(self, frame, target, detector):
+        """Returns a PublishedFrame of `frame` and the detector's mask, backed by the next free slot."""
+        with self._lock:
+            if self._frames is None or self._frames.shape[1:] != frame.shape:
+                # Frames already handed out keep the old arrays alive; their generations still move on
+                self._frames = np.empty((self.slots,) + frame.shape, dtype=frame.dtype)
+                self._masks = np.empty((self.slots,) + frame.shape[:2], dtype=np.uint8)
+            index = None
+            for offset in range(self.slots):
+                candidate = (self._next + offset) % self.slots
+                if not self._pins[candidate]:
+                    index = candidate
+                    break
+            if index is None:
+                self.fallbacks += 1
+                return PublishedFrame(frame.copy(), target, detector.full_mask(frame.shape))
+            self._next = (index + 1) % self.slots
+            self._generations[index] += 1
+            generation = self._generations[index]
+        # Unpinned and with a new generation, nobody can pin this slot until the next publish
+        np.copyto(self._frames[index], frame)
+        mask = detector.full_mask(frame.shape, out=self._masks[index])
+        return PublishedFrame(self._frames[index], target, mask, self, index, generation)
+
+    def pin(self, index, generation):
+        """Pins a slot for an encode; returns False if it has been reused since `generation`."""
+        with self._lock:
+            if self._generations[index] != generation:
+                return False
+            self._pins[index] += 1
+            return True
+
+    def unpin(self, index):
+        with self._lock:
+            self._pins[index] -= 1
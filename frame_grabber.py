@@ -0,0 +1,131 @@
+import threading
+import time
+
+import numpy as np
+
+
+class FrameGrabber:
+    """
+    Keeps reading from a cv2.VideoCapture on its own thread.
+
+    Frames land in a small preallocated ring of slots and only the newest one
+    is handed out, so a slow detector always works on the freshest image and
+    never on something that sat in the V4L2 queue. Frames that were captured
+    but replaced before anyone read them are counted in `dropped`.
+    """
+
+    def __init__(self, cap, slots=3):
+        if slots < 3:
+            raise ValueError("FrameGrabber needs at least 3 slots (writing, latest, reading)")
+        self.cap = cap
+        self.slots = slots
+        self.captured = 0  # Frames read from the camera
+        self.consumed = 0  # Frames handed to the reader
+        self.dropped = 0  # Frames overwritten before the reader got to them
+
+        self._ring = None
+        self._timestamps = [0.0] * slots
+        self._sequences = [-1] * slots
+        self._latest = None  # Slot index of the newest complete frame
+        self._reading = None  # Slot index currently checked out by the reader
+        self._latest_read = True
+        self._running = False
+        self._failed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """Starts the capture thread."""
+        self._running = True
+        self._failed = False
+        self._thread = threading.Thread(target=self._run, name="frame-grabber")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        """Stops the capture thread; any blocked read() returns None."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._running and not self._failed
+
+    def read(self, after_seq=-1, timeout=None):
+        """
+        Returns the newest frame as (sequence, timestamp, frame).
+
+        The frame is a view into the ring and stays valid (and safe to draw on)
+        until the next call to read(). Only one reader is supported.
+
+        Args:
+            after_seq (int): Wait for a frame with a sequence number greater than this.
+            timeout (float): Seconds to wait before giving up and returning None.
+        """
+        with self._cond:
+            self._reading = None
+            ready = self._cond.wait_for(
+                lambda: not self.running
+                or (self._latest is not None and self._sequences[self._latest] > after_seq),
+                timeout,
+            )
+            if not ready or self._latest is None or self._sequences[self._latest] <= after_seq:
+                return None
+            index = self._latest
+            self._reading = index
+            self._latest_read = True
+            self.consumed += 1
+            return self._sequences[index], self._timestamps[index], self._ring[index]
+
+    def stats(self):
+        """Returns capture counters for reporting."""
+        return {'captured': self.captured, 'consumed': self.consumed, 'dropped': self.dropped}
+
+    def _allocate(self, frame):
+        self._ring = np.empty((self.slots,) + frame.shape, dtype=frame.dtype)
+        self._latest = None
+        self._reading = None
+
+    def _next_slot(self):
+        for offset in range(1, self.slots + 1):
+            index = ((self._latest if self._latest is not None else -1) + offset) % self.slots
+            if index != self._latest and index != self._reading:
+                return index
+        raise RuntimeError("No free capture slot")
+
+    def _run(self):
+        while self._running:
+            with self._cond:
+                index = self._next_slot() if self._ring is not None else None
+            slot = self._ring[index] if index is not None else None
+
+            success, frame = self.cap.read(slot)
+            timestamp = time.monotonic()
+            if not success:
+                with self._cond:
+                    self._failed = True
+                    self._cond.notify_all()
+                break
+
+            with self._cond:
+                if slot is None or frame.shape != slot.shape or frame.dtype != slot.dtype:
+                    # First frame, or the camera changed format: size the ring to match
+                    self._allocate(frame)
+                    index = 0
+                    self._ring[index] = frame
+                elif frame is not slot:
+                    np.copyto(slot, frame)
+
+                if not self._latest_read:
+                    self.dropped += 1
+                self._timestamps[index] = timestamp
+                self._sequences[index] = self.captured
+                self._latest = index
+                self._latest_read = False
+                self.captured += 1
+                self._cond.notify_all()
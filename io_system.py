@@ -6,17 +6,14 @@ import time
 # Set display environment variable for running Pygame on the Pi's screen
 os.environ["DISPLAY"] = ":0"
 
-# Initialize pygame
-pygame.init()
-
-# Set up the display (e.g., 480x320 for a Waveshare 3.5-inch LCD)
-screen = pygame.display.set_mode((480, 320), pygame.FULLSCREEN)
+# The display and fonts are set up by init_display(), not at import
+screen = None
+font = None
+message_font = None
 
 # Background color and text properties
 black = (0, 0, 0)
 white = (255, 255, 255)
-screen.fill(black)
-
 colors = [
     (255, 0, 0),    # Red for "Chest Pass"
     (0, 100, 0),    # Green
@@ -25,8 +22,6 @@ colors = [
     (255, 165, 0)   # Orange for "Reset"
 ]
 
-font = pygame.font.Font(pygame.font.match_font('arial'), 17)
-
 # Define rectangles for button layout
 rectangles = [
     pygame.Rect(20, 20, 120, 100),  # "Chest Pass"
@@ -47,23 +42,42 @@ rectangle_names = [
 corner_radius = 5
 selected_button = None
 
+# Button labels never change, so init_display() renders them once
+labels = []
+label_rects = []
+
+def init_display():
+    """Initializes pygame and the touchscreen, loads the fonts and draws the menu. Safe to call again."""
+    global screen, font, message_font, labels, label_rects
+    if screen is not None and pygame.display.get_init():
+        return screen
+    pygame.init()
+    # Set up the display (e.g., 480x320 for a Waveshare 3.5-inch LCD)
+    screen = pygame.display.set_mode((480, 320), pygame.FULLSCREEN)
+    # Fonts are loaded once; match_font scans the installed fonts on every call
+    font = pygame.font.Font(pygame.font.match_font('arial'), 17)
+    message_font = pygame.font.Font(pygame.font.match_font('arial'), 24)
+    labels = [font.render(name, True, white) for name in rectangle_names]
+    label_rects = [label.get_rect(center=rect.center) for label, rect in zip(labels, rectangles)]
+    draw_menu()
+    return screen
+
 def draw_buttons():
     """Draws the interactive buttons on the screen."""
     for i, rect in enumerate(rectangles):
         pygame.draw.rect(screen, colors[i], rect, corner_radius)
-        placeholder_text = font.render(rectangle_names[i], True, white)
-        text_rect = placeholder_text.get_rect(center=rect.center)
-        screen.blit(placeholder_text, text_rect)
+        screen.blit(labels[i], label_rects[i])
 
-# Draw initial buttons and update the display
-draw_buttons()
-pygame.display.update()
+def draw_menu():
+    """Draws the whole menu and pushes it to the display."""
+    screen.fill(black)
+    draw_buttons()
+    pygame.display.update()
 
 def display_message(message, color=(255, 255, 255), duration=3):
     """Displays a temporary message on the screen."""
-    font = pygame.font.Font(pygame.font.match_font('arial'), 24)
     screen.fill(black)
-    message_text = font.render(message, True, color)
+    message_text = message_font.render(message, True, color)
     message_rect = message_text.get_rect(center=(240, 160))
     screen.blit(message_text, message_rect)
     pygame.display.update()
@@ -71,48 +85,54 @@ def display_message(message, color=(255, 255, 255), duration=3):
 
 def countdown_display(start=5):
     """Displays a countdown from the specified start value down to 1."""
-    font = pygame.font.Font(pygame.font.match_font('arial'), 24)
+    screen.fill(black)
+    pygame.display.update()
+    previous_rect = None
     for i in range(start, 0, -1):
-        screen.fill(black)
-        countdown_text = font.render(f"Chest Pass selected. Turret starting in {i}...", True, white)
+        countdown_text = message_font.render(f"Chest Pass selected. Turret starting in {i}...", True, white)
         countdown_text_rect = countdown_text.get_rect(center=(240, 160))
+        # Only the text changes: clear the old line and update just that area
+        dirty = countdown_text_rect if previous_rect is None else countdown_text_rect.union(previous_rect)
+        screen.fill(black, dirty)
         screen.blit(countdown_text, countdown_text_rect)
-        pygame.display.update()
+        pygame.display.update(dirty)
+        previous_rect = countdown_text_rect
         time.sleep(1)
 
 def start_io_system():
     """Handles the user interaction for the touchscreen interface."""
+    init_display()
+    # The menu is static: sleep until one of these arrives instead of redrawing in a busy loop
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed([pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN])
     running = True
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            running = False
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_q:
                 running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
-                    running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = event.pos
-                for i, rect in enumerate(rectangles):
-                    if rect.collidepoint(mouse_pos):
-                        selected_button = i + 1
-                        print(f"Button {rectangle_names[i]} pressed, outputting state {selected_button}")
-                        
-                        # Display message on the screen
-                        display_message(f"{rectangle_names[i]} selected", color=white if i == 0 else colors[i])
-
-                        if i == 0:  # "Chest Pass" selected
-                            countdown_display(5)  # Display countdown before starting
-                            pygame.quit()  # Quit Pygame after showing the message
-                            return 'Chest Pass'
-                        elif i == 4:  # "Reset" button selected
-                            display_message('Resetting...', color=(255, 0, 0))
-                            return 'Reset'
-
-        # Redraw buttons to maintain visual state
-        screen.fill(black)
-        draw_buttons()
-        pygame.display.update()
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            mouse_pos = event.pos
+            for i, rect in enumerate(rectangles):
+                if rect.collidepoint(mouse_pos):
+                    selected_button = i + 1
+                    print(f"Button {rectangle_names[i]} pressed, outputting state {selected_button}")
+
+                    # Display message on the screen
+                    display_message(f"{rectangle_names[i]} selected", color=white if i == 0 else colors[i])
+
+                    if i == 0:  # "Chest Pass" selected
+                        countdown_display(5)  # Display countdown before starting
+                        pygame.quit()  # Quit Pygame after showing the message
+                        return 'Chest Pass'
+                    elif i == 4:  # "Reset" button selected
+                        display_message('Resetting...', color=(255, 0, 0))
+                        return 'Reset'
+
+                    # The message replaced the menu; put it back
+                    draw_menu()
 
     pygame.quit()
     sys.exit()
-
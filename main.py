@@ -1,6 +1,32 @@
+import startup_trace  # First, so the startup clock covers every import below
+import os
 import threading
-from io_system import start_io_system
-from camera_control import app, start_camera_control  # Updated import to reflect new function name
+from io_system import init_display, start_io_system
+
+# ABRS_MULTIPROCESS=1 runs vision, UI/streaming and control in separate processes
+MULTIPROCESS = os.environ.get('ABRS_MULTIPROCESS', '0') == '1'
+
+def warm_up():
+    """
+    Loads the vision stack and brings up the hardware while the menu is on screen.
+
+    The OpenCV/Flask imports, opening the camera and the motor setup all run
+    here, in the background, instead of delaying the menu.
+    """
+    with startup_trace.step('vision imports'):
+        import camera_control
+        import vision_process  # noqa: F401 (imported now so selecting a mode does not wait for it)
+    if MULTIPROCESS:
+        return  # The camera and motor must be opened after the worker processes are forked
+
+    # Open the camera and set up the motor GPIO in parallel
+    camera_control.warm_up()
+
+    # Start the streaming server (Flask or asyncio) in a separate thread;
+    # in multi-process mode the UI process runs it instead
+    flask_thread = threading.Thread(target=camera_control.serve, args=(8080,))
+    flask_thread.daemon = True
+    flask_thread.start()
 
 def main():
     """
@@ -8,21 +34,40 @@ def main():
     Launches the touchscreen interface for the user to select options.
     """
     print("Initializing system...")
-    result = start_io_system()  # Starts the touchscreen interface to display options
-    
-    # Start Flask server in a separate thread to be available for streaming
-    flask_thread = threading.Thread(target=lambda: app.run(host='0.0.0.0', port=8080, threaded=True))
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    # Wait for the selection result to determine next steps
-    if result == 'Chest Pass':
-        print("Chest Pass selected, starting camera control phase...")
-        start_camera_control()  # Updated to call the new `start_camera_control` function
-
-    elif result == 'Reset':
-        print("Resetting system...")
-        # You could add any specific reset logic here if needed
+    init_display()
+    startup_trace.mark(startup_trace.MENU)
+
+    warm_up_thread = threading.Thread(target=warm_up, name="warm-up")
+    warm_up_thread.daemon = True
+    warm_up_thread.start()
+
+    camera_control_started = False
+    try:
+        result = start_io_system()  # Starts the touchscreen interface to display options
+        warm_up_thread.join()
+
+        # Wait for the selection result to determine next steps
+        if result == 'Chest Pass':
+            print("Chest Pass selected, starting camera control phase...")
+            camera_control_started = True  # Camera control cleans up the motor itself
+            if MULTIPROCESS:
+                from vision_process import run_multiprocess
+                run_multiprocess()
+            else:
+                from camera_control import start_camera_control
+                start_camera_control()
+
+        elif result == 'Reset':
+            print("Resetting system...")
+            # You could add any specific reset logic here if needed
+    finally:
+        if not camera_control_started:
+            # warm_up() may have started the motion engine behind the menu; Reset and quitting
+            # (start_io_system exits the process) must not leave it and the GPIO pins running
+            warm_up_thread.join()
+            import motor_control
+            if motor_control.engine is not None:
+                motor_control.cleanup_motor_gpio()
 
 if __name__ == "__main__":
     main()
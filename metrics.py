@@ -0,0 +1,188 @@
+import bisect
+import os
+import threading
+import time
+
+# Set ABRS_METRICS=0 to start with instrumentation switched off
+enabled = os.environ.get('ABRS_METRICS', '1') != '0'
+
+PREFIX = 'abrs'
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 256  # Samples kept per stage for the recent quantiles
+
+
+def set_enabled(flag):
+    """Turns every stage timer on or off; when off a timed block costs one flag check."""
+    global enabled
+    enabled = bool(flag)
+
+
+class StageTimer:
+    """
+    Times one stage of a loop.
+
+    Use it as a context manager around the stage. Samples go into a
+    cumulative bucket histogram (for Prometheus) and into a small ring of
+    recent samples (for the live quantiles). A timer keeps its start time on
+    itself, so the `with` form must only be used from a single thread;
+    observe() takes the timer's lock and may be called from any number of
+    threads, e.g. the viewer threads that encode frames.
+    """
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help_text = help_text or f"Time spent in the {name} stage"
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = [0.0] * WINDOW
+        self._index = 0
+        self._start = 0.0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        if enabled:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self._start:
+            self.observe(time.perf_counter() - self._start)
+            self._start = 0.0
+
+    def observe(self, seconds):
+        """Records one sample, in seconds."""
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.sum += seconds
+            self.recent[self._index % WINDOW] = seconds
+            self._index += 1
+
+    def snapshot(self):
+        """Returns (buckets, count, sum) as of one moment, for render()."""
+        with self._lock:
+            return list(self.buckets), self.count, self.sum
+
+    def recent_samples(self):
+        with self._lock:
+            return sorted(self.recent[:min(self._index, WINDOW)])
+
+    def quantile(self, q):
+        samples = self.recent_samples()
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class RateMeter:
+    """Counts loop iterations and reports the recent iteration rate."""
+
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help_text = help_text or f"Iterations of the {name} loop"
+        self.count = 0
+        self._times = [0.0] * WINDOW
+
+    def tick(self):
+        if enabled:
+            self._times[self.count % WINDOW] = time.monotonic()
+            self.count += 1
+
+    def rate(self):
+        """Iterations per second over the recent window."""
+        samples = min(self.count, WINDOW)
+        if samples < 2:
+            return 0.0
+        newest = self._times[(self.count - 1) % WINDOW]
+        oldest = self._times[(self.count - samples) % WINDOW]
+        return (samples - 1) / (newest - oldest) if newest > oldest else 0.0
+
+
+_lock = threading.Lock()
+_stages = {}
+_rates = {}
+_values = {}  # name -> (kind, help, callable)
+
+
+def stage(name, help_text=''):
+    """Returns the StageTimer for a stage, creating it on first use."""
+    with _lock:
+        if name not in _stages:
+            _stages[name] = StageTimer(name, help_text)
+        return _stages[name]
+
+
+def rate(name, help_text=''):
+    """Returns the RateMeter for a loop, creating it on first use."""
+    with _lock:
+        if name not in _rates:
+            _rates[name] = RateMeter(name, help_text)
+        return _rates[name]
+
+
+def register_value(name, read, help_text='', kind='gauge'):
+    """
+    Exposes a value that is read at scrape time, e.g. a counter kept elsewhere.
+
+    Args:
+        name (str): Metric name without the prefix.
+        read (callable): Returns the current value, or None to skip it.
+        kind (str): 'gauge' or 'counter'.
+    """
+    with _lock:
+        _values[name] = (kind, help_text or name, read)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        stages = list(_stages.values())
+        rates = list(_rates.values())
+        values = list(_values.items())
+
+    lines.append(f'# HELP {PREFIX}_instrumentation_enabled Whether stage timers are recording')
+    lines.append(f'# TYPE {PREFIX}_instrumentation_enabled gauge')
+    lines.append(f'{PREFIX}_instrumentation_enabled {int(enabled)}')
+
+    if stages:
+        metric = f'{PREFIX}_stage_seconds'
+        lines.append(f'# HELP {metric} Time spent per loop stage')
+        lines.append(f'# TYPE {metric} histogram')
+        for timer in stages:
+            buckets, count, total = timer.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{{stage="{timer.name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{timer.name}",le="+Inf"}} {count}')
+            lines.append(f'{metric}_sum{{stage="{timer.name}"}} {total:.9f}')
+            lines.append(f'{metric}_count{{stage="{timer.name}"}} {count}')
+
+        metric = f'{PREFIX}_stage_recent_seconds'
+        lines.append(f'# HELP {metric} Quantiles over the last {WINDOW} samples per stage')
+        lines.append(f'# TYPE {metric} gauge')
+        for timer in stages:
+            for q in QUANTILES:
+                lines.append(f'{metric}{{stage="{timer.name}",quantile="{q}"}} {timer.quantile(q):.9f}')
+
+    for meter in rates:
+        lines.append(f'# HELP {PREFIX}_{meter.name}_loop_hz {meter.help_text} per second')
+        lines.append(f'# TYPE {PREFIX}_{meter.name}_loop_hz gauge')
+        lines.append(f'{PREFIX}_{meter.name}_loop_hz {meter.rate():.3f}')
+        lines.append(f'# HELP {PREFIX}_{meter.name}_loop_iterations_total {meter.help_text}')
+        lines.append(f'# TYPE {PREFIX}_{meter.name}_loop_iterations_total counter')
+        lines.append(f'{PREFIX}_{meter.name}_loop_iterations_total {meter.count}')
+
+    for name, (kind, help_text, read) in values:
+        value = read()
+        if value is None:
+            continue
+        lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+        lines.append(f'{PREFIX}_{name} {value}')
+
+    return '\n'.join(lines) + '\n'
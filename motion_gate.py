@@ -0,0 +1,104 @@
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+
+THUMB_SIZE = (32, 24)  # (width, height) of the thumbnail frames are compared on
+THRESHOLD = 12  # Levels any channel of a thumbnail pixel may change by and still count as unchanged
+FORCE_EVERY = 15  # Frames; a full detection pass runs at least this often
+MARGIN = 1  # Thumbnail pixels around the target box that are also checked
+
+gate_stage = metrics.stage('gate', "Motion gate thumbnail and comparison")
+
+
+class MotionGate:
+    """
+    Decides whether a frame needs a full detection pass.
+
+    Each frame is shrunk to a tiny thumbnail and compared with the
+    thumbnail of the frame that was last fully detected. The thumbnail
+    keeps its colour: a red target can be close to the background in
+    grey, and a grayscale gate would miss it moving. If no channel changed
+    by more than `threshold` levels inside the tracked region (the last
+    target's box plus `margin`, or the whole thumbnail when there was no
+    target), unchanged() returns True and `last` can be reused.
+    Comparing with the last detected frame, rather than the previous one,
+    keeps slow drift from adding up unnoticed; a full pass is also forced
+    every `force_every` frames so a stale result cannot stick.
+
+    Thumbnails live in preallocated buffers. `hits` / `checks` is the hit
+    rate, and `saved` estimates the detection time skipped, in seconds:
+    the recent cost of a full pass minus the gate's own cost, per hit.
+    """
+
+    def __init__(self, size=THUMB_SIZE, threshold=THRESHOLD, force_every=FORCE_EVERY, margin=MARGIN):
+        width, height = size
+        self.size = size
+        self.threshold = threshold
+        self.force_every = force_every
+        self.margin = margin
+        self.last = None  # Detection from the last full pass
+        self.checks = 0
+        self.hits = 0
+        self.saved = 0.0
+        self.detect_cost = 0.0  # Recent time of a full detection pass, seconds
+        self._thumbs = (np.empty((height, width, 3), dtype=np.uint8), np.empty((height, width, 3), dtype=np.uint8))
+        self._diff = np.empty((height, width, 3), dtype=np.uint8)
+        self._current = 0  # Index of the thumbnail being filled; the other is the reference
+        self._reference_shape = None  # Frame shape the reference thumbnail came from
+        self._since_full = 0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.checks if self.checks else 0.0
+
+    def unchanged(self, frame):
+        """Returns True if `last` still holds for this frame, False if it needs a full pass."""
+        start = time.perf_counter()
+        self.checks += 1
+        thumb = self._thumbs[self._current]
+        cv2.resize(frame, self.size, dst=thumb, interpolation=cv2.INTER_AREA)
+        hit = (frame.shape == self._reference_shape and self._since_full < self.force_every
+               and self._region_still(frame.shape))
+        cost = time.perf_counter() - start
+        if metrics.enabled:
+            gate_stage.observe(cost)
+        if hit:
+            self.hits += 1
+            self._since_full += 1
+            self.saved += max(0.0, self.detect_cost - cost)
+        return hit
+
+    def remember(self, target, seconds, frame_shape):
+        """
+        Records the result of a full pass on the frame unchanged() last looked at.
+
+        Args:
+            target: Detection found, or None.
+            seconds (float): How long the full pass took.
+            frame_shape (tuple): Shape of the frame.
+        """
+        self.last = target
+        self._since_full = 0
+        self._reference_shape = frame_shape
+        self._current ^= 1  # This frame's thumbnail becomes the reference
+        self.detect_cost = seconds if not self.detect_cost else 0.8 * self.detect_cost + 0.2 * seconds
+
+    def _region_still(self, shape):
+        current = self._thumbs[self._current]
+        reference = self._thumbs[self._current ^ 1]
+        width, height = self.size
+        x0, y0, x1, y1 = 0, 0, width, height
+        target = self.last
+        if target is not None:
+            scale_x = width / shape[1]
+            scale_y = height / shape[0]
+            x0 = max(0, int(target.x * scale_x) - self.margin)
+            y0 = max(0, int(target.y * scale_y) - self.margin)
+            x1 = min(width, int(np.ceil((target.x + target.w) * scale_x)) + self.margin)
+            y1 = min(height, int(np.ceil((target.y + target.h) * scale_y)) + self.margin)
+        diff = self._diff[y0:y1, x0:x1]
+        cv2.absdiff(current[y0:y1, x0:x1], reference[y0:y1, x0:x1], dst=diff)
+        return diff.max() <= self.threshold
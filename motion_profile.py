@@ -0,0 +1,94 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+START_RATE = 200.0  # Steps per second the motor can start or stop at without a ramp (pull-in rate)
+PROFILES = ('trapezoid', 's-curve')
+
+
+def plan(distance, max_rate, acceleration, shape='trapezoid', start_rate=START_RATE):
+    """
+    Returns the step timing for a move as a NumPy array of intervals.
+
+    `intervals[i]` is the wait, in seconds, before step i; the first entry is
+    0 so the first step goes out immediately. The motor ramps up from
+    `start_rate`, cruises at `max_rate` if the move is long enough to reach
+    it, and ramps back down so the last step is taken at `start_rate`. A
+    move at or below `start_rate` runs at `max_rate` throughout.
+
+    Tables are cached by (distance, max rate, acceleration, shape) and
+    shared, so they are returned read-only.
+
+    Args:
+        distance (int): Number of steps; the sign is ignored.
+        max_rate (float): Cruise rate in steps per second.
+        acceleration (float): Peak acceleration in steps per second squared.
+        shape (str): 'trapezoid' (constant acceleration) or 's-curve'
+            (acceleration eases in and out, limiting jerk).
+    """
+    if shape not in PROFILES:
+        raise ValueError(f"Unknown motion profile {shape!r}; expected one of {PROFILES}")
+    return _plan(abs(int(distance)), round(float(max_rate)), round(float(acceleration)), shape, float(start_rate))
+
+
+def duration(distance, max_rate, acceleration, shape='trapezoid', start_rate=START_RATE):
+    """Returns how long a move takes, in seconds, from its first step to its last."""
+    return float(plan(distance, max_rate, acceleration, shape, start_rate).sum())
+
+
+def ramp_steps(rate, acceleration, start_rate=START_RATE):
+    """Returns how many steps it takes to ramp between `start_rate` and `rate` (either way)."""
+    if rate <= start_rate:
+        return 0
+    return int(math.ceil((rate * rate - start_rate * start_rate) / (2 * acceleration)))
+
+
+@lru_cache(maxsize=512)
+def _plan(distance, max_rate, acceleration, shape, start_rate):
+    if distance == 0:
+        intervals = np.zeros(0)
+    elif distance == 1 or acceleration <= 0 or max_rate <= start_rate:
+        intervals = np.full(distance, 1.0 / max_rate)  # Below the pull-in rate a constant rate is safe
+        intervals[0] = 0.0
+    else:
+        positions = np.arange(distance, dtype=np.float64)  # Position at which each step is issued
+        intervals = np.diff(_step_times(positions, distance, max_rate, acceleration, shape, start_rate), prepend=0.0)
+    intervals.flags.writeable = False
+    return intervals
+
+
+def _step_times(x, distance, max_rate, acceleration, shape, start_rate):
+    """Time at which the profile passes each position in `x`."""
+    v0 = start_rate
+    a = acceleration
+    if shape == 'trapezoid':
+        # Constant acceleration: x = v0 t + a t^2 / 2
+        peak = min(max_rate, math.sqrt(v0 * v0 + a * distance))
+        ramp_distance = (peak * peak - v0 * v0) / (2 * a)
+        ramp_time = (peak - v0) / a
+
+        def ramp(position):
+            return (np.sqrt(v0 * v0 + 2 * a * position) - v0) / a
+    else:
+        # Cosine velocity ramp; its peak acceleration is `a`, its mean 2a/pi
+        peak = min(max_rate, math.sqrt(v0 * v0 + 2 * a * distance / math.pi))
+        ramp_time = math.pi * (peak - v0) / (2 * a)
+        ramp_distance = (v0 + peak) / 2 * ramp_time
+        # x(t) has no closed-form inverse; sample it densely and interpolate
+        t = np.linspace(0.0, ramp_time, max(64, int(ramp_distance) * 8))
+        ramp_positions = v0 * t + (peak - v0) / 2 * (t - ramp_time / math.pi * np.sin(math.pi * t / ramp_time))
+
+        def ramp(position):
+            return np.interp(position, ramp_positions, t)
+
+    total_time = 2 * ramp_time + (distance - 2 * ramp_distance) / peak
+    return np.where(
+        x <= ramp_distance,
+        ramp(np.minimum(x, ramp_distance)),
+        np.where(
+            x <= distance - ramp_distance,
+            ramp_time + (x - ramp_distance) / peak,
+            total_time - ramp(np.clip(distance - x, 0.0, ramp_distance)),
+        ),
+    )
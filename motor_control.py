@@ -1,31 +1,793 @@
-import RPi.GPIO as GPIO
+import queue
+import threading
 import time
 
-# GPIO pin setup for motor control
-DIR_PIN = 20  # GPIO pin for direction
-STEP_PIN = 21  # GPIO pin for stepping
+import numpy as np
+
+import metrics
+import motion_profile
+import realtime
+
+try:
+    import RPi.GPIO as GPIO
+except ImportError:  # Not running on a Pi; only the simulated backend is available
+    GPIO = None
+
+# GPIO pin setup for the pan motor and its limit switches (wired as in TEST-final_pan)
+DIR_PIN = 21  # GPIO pin for direction
+STEP_PIN = 13  # GPIO pin for stepping
+LIMIT_LEFT_PIN = 20  # Left limit switch; pulled up, reads LOW when pressed
+LIMIT_RIGHT_PIN = 16  # Right limit switch
+TILT_DIR_PIN = 5  # Tilt motor direction (as in TEST-tilt_stepper)
+TILT_STEP_PIN = 12  # Tilt motor step
+
+# Motion parameters
+STEP_RATE = 500  # Default steps per second for moves (old 1 ms high / 1 ms low pulse)
+PULSE_WIDTH = 0.0002  # Seconds the step pin is held high per pulse
+MAX_STEP_RATE = 1 / (2 * PULSE_WIDTH)  # Fastest rate the pulse width allows
+HOMING_RATE = 400  # Steps per second while seeking a limit switch
+RECENTER_RATE = MAX_STEP_RATE  # Steps per second for the move back to center
+SOFT_LIMIT_MARGIN = 40  # Steps kept clear of each switch once homed
+SEEK_POLL = 0.05  # Seconds between checks on the engine while homing looks for a switch
+LIMIT_BOUNCE_MS = 20  # Debounce for the limit switch edge callbacks
+TILT_LIMIT = 600  # Steps tilt may travel either way from where it started; it has no switches
+ACCELERATION = 6000  # Steps per second squared for planned moves
+MOTION_PROFILE = 'trapezoid'  # Or 's-curve'; see motion_profile.plan
+MAX_LATENESS = 0.005  # A pulse this late resets the schedule instead of bursting to catch up
+MIN_GAP = 0.75  # Catching up after a late pulse never shortens a gap below this fraction of plan
+
+pulse_stage = metrics.stage('motor_pulse', "One step pulse including the pin writes")
+motion_rate = metrics.rate('motion', "Step pulses issued by the motion engine")
+# Pulses are timed with observe() since the engine already has both timestamps
+lateness_stage = metrics.stage('step_lateness', "How late each step pulse went out against its deadline")
+
+
+class GPIOBackend:
+    """Pin backend that drives the real Raspberry Pi GPIO header."""
+
+    def __init__(self):
+        if GPIO is None:
+            raise RuntimeError("RPi.GPIO is not available on this machine")
+        GPIO.setmode(GPIO.BCM)
+
+    def setup_output(self, pin):
+        GPIO.setup(pin, GPIO.OUT)
+
+    def output(self, pin, value):
+        GPIO.output(pin, GPIO.HIGH if value else GPIO.LOW)
+
+    def setup_input(self, pin):
+        GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+    def input(self, pin):
+        return GPIO.input(pin) == GPIO.HIGH
+
+    def on_falling_edge(self, pin, callback):
+        """Calls callback(pin) from the GPIO library's thread when the pin goes LOW."""
+        GPIO.add_event_detect(pin, GPIO.FALLING, callback=callback, bouncetime=LIMIT_BOUNCE_MS)
+
+    def cleanup(self):
+        GPIO.cleanup()
+
+
+class SimulatedBackend:
+    """
+    Pin backend that only records what would have been written to the pins.
+
+    Every level change is kept in `events` as (timestamp, pin, value), and the
+    rising edge of each pulse is kept per pin in `pulses`, so the motion engine
+    can be exercised on a machine without RPi.GPIO. Inputs are driven with
+    set_input(), or by add_travel() which presses limit switches when the
+    simulated axis runs past its ends.
+    """
+
+    def __init__(self):
+        self.levels = {}
+        self.events = []
+        self.pulses = {}
+        self._callbacks = {}
+        self._axes = {}  # step pin -> simulated axis travel
+
+    def setup_output(self, pin):
+        self.levels[pin] = False
+
+    def output(self, pin, value):
+        value = bool(value)
+        now = time.perf_counter()
+        rising = value and not self.levels.get(pin, False)
+        if rising:
+            self.pulses.setdefault(pin, []).append(now)
+        self.levels[pin] = value
+        self.events.append((now, pin, value))
+        if rising and pin in self._axes:
+            self._move_axis(self._axes[pin])
+
+    def setup_input(self, pin):
+        self.levels[pin] = True  # Pulled up
+
+    def input(self, pin):
+        return self.levels.get(pin, True)
+
+    def on_falling_edge(self, pin, callback):
+        self._callbacks.setdefault(pin, []).append(callback)
+
+    def set_input(self, pin, value):
+        """Drives an input pin, firing falling-edge callbacks like the GPIO library would."""
+        falling = self.levels.get(pin, True) and not value
+        self.levels[pin] = bool(value)
+        if falling:
+            for callback in self._callbacks.get(pin, []):
+                callback(pin)
+
+    def add_travel(self, step_pin, dir_pin, low_pin, high_pin, low, high, start=0):
+        """
+        Simulates an axis whose limit switches close at `low` and `high` steps.
+
+        The axis position follows the step pulses (direction from `dir_pin`,
+        HIGH counting up), starting at `start`. Pass None for the switch pins
+        of an axis that has none, e.g. tilt.
+        """
+        self._axes[step_pin] = {'dir_pin': dir_pin, 'low_pin': low_pin, 'high_pin': high_pin,
+                                'low': low, 'high': high, 'position': start}
+
+    def axis_position(self, step_pin):
+        return self._axes[step_pin]['position']
+
+    def _move_axis(self, axis):
+        axis['position'] += 1 if self.levels.get(axis['dir_pin']) else -1
+        position = axis['position']
+        if axis['low_pin'] is not None:
+            self.set_input(axis['low_pin'], position > axis['low'])
+        if axis['high_pin'] is not None:
+            self.set_input(axis['high_pin'], position < axis['high'])
+
+    def pulse_times(self, pin):
+        """Returns the rising-edge timestamps recorded on a pin."""
+        return list(self.pulses.get(pin, []))
+
+    def jitter(self, pin, intervals):
+        """
+        Compares the last recorded pulses on a pin with the intervals they were planned at.
+
+        Args:
+            pin (int): Step pin.
+            intervals: Planned per-step intervals, e.g. from motion_profile.plan();
+                the first entry (the wait before the first step) is ignored.
+
+        Returns:
+            dict: Interval error statistics in microseconds and the fastest
+            rate actually reached, or None if too few pulses were recorded.
+        """
+        planned = np.asarray(intervals, dtype=np.float64)[1:]
+        times = np.asarray(self.pulses.get(pin, []), dtype=np.float64)
+        if len(planned) == 0 or len(times) < len(planned) + 1:
+            return None
+        actual = np.diff(times[-(len(planned) + 1):])
+        error = (actual - planned) * 1e6
+        return {
+            'pulses': len(actual),
+            'mean_us': float(error.mean()),
+            'p99_us': float(np.percentile(np.abs(error), 99)),
+            'max_us': float(np.abs(error).max()),
+            'peak_rate': float(1.0 / actual.min()),
+            'planned_peak_rate': float(1.0 / planned.min()),
+        }
+
+    def cleanup(self):
+        self.levels.clear()
+
+
+class MotionEngine:
+    """
+    Dedicated thread that owns the step/dir pins of the pan stepper and, if
+    `tilt_pins` is given, the tilt stepper.
+
+    Callers never touch the pins; they post commands (move, retarget,
+    set velocity, stop) and return immediately. The engine drains its
+    command queue between steps, so a newer command takes effect on the
+    very next pulse.
+
+    Moves follow a motion_profile table (trapezoid or S-curve at
+    `acceleration`), so they ramp up to speed and back down instead of
+    starting and stopping at full rate. A retarget mid-move continues from
+    the current speed, braking first if it reverses direction. Every pulse
+    is scheduled against an absolute deadline, so sleep overshoot does not
+    accumulate along a move.
+
+    Both axes are stepped by the same scheduler. A two-axis move
+    (move_axes) is planned for the axis with more steps to go and the other
+    axis is interleaved Bresenham-style, so both start and finish together.
+    Velocity jogging on either axis runs alongside, each pulse stream on its
+    own deadlines.
+
+    With `limit_pins` given, the limit switches are watched through
+    edge-triggered callbacks and the engine refuses to pulse toward a
+    pressed switch. home() finds both switches and switches the engine to
+    absolute positioning with soft limits, after which a switch hit should
+    never happen; if it does, the engine stops, re-syncs its position and
+    moves straight back to center.
+
+    The engine thread pins itself to `cpus` and, with a `priority`, runs
+    under SCHED_FIFO, so its sleeps wake up on time even with vision, the
+    streaming server and pygame busy; see realtime for the ABRS_* settings.
+    """
+
+    def __init__(self, backend, dir_pin=DIR_PIN, step_pin=STEP_PIN, step_rate=STEP_RATE, limit_pins=None,
+                 acceleration=ACCELERATION, profile=MOTION_PROFILE, tilt_pins=None, tilt_limit=TILT_LIMIT,
+                 cpus=realtime.MOTION_CPUS, priority=realtime.MOTION_PRIORITY):
+        self.backend = backend
+        self.dir_pin = dir_pin
+        self.step_pin = step_pin
+        self.step_rate = step_rate
+        self.limit_pins = limit_pins  # (left pin, right pin), or None without switches
+        self.position = 0  # Steps from where the engine started (or from the left switch once homed)
+        self.tilt_dir_pin, self.tilt_step_pin = tilt_pins or (None, None)
+        self.tilt_position = 0  # Steps from where tilt started
+        self.tilt_limits = (-tilt_limit, tilt_limit)
+        self.steps_issued = 0  # On both axes
+        self.limit_hits = 0
+        self.homed = False
+        self.span = None  # Steps between the two switches, once homed
+        self.soft_limits = None  # (lowest, highest) position allowed, once homed
+        self.recenter_on_limit = True
+        self.acceleration = acceleration
+        self.profile = profile
+        self.late_pulses = 0  # Pulses that missed their deadline by more than MAX_LATENESS
+        self.max_lateness = 0.0
+        self.cpus = cpus
+        self.priority = priority
+
+        self._commands = queue.Queue()
+        self._target = None  # Absolute step target while a move is active
+        self._move_rate = step_rate
+        self._velocity = 0.0  # Signed steps per second while jogging
+        self._tilt_target = None
+        self._tilt_velocity = 0.0
+        self._intervals = None  # Planned step intervals for the active move
+        self._step_index = 0  # Next entry of _intervals
+        self._path_directions = (0, 0)  # (pan, tilt) direction of the active move
+        self._path_counts = (0, 0)  # Steps per axis over the planned table
+        self._path_errors = [0, 0]  # Bresenham accumulators
+        self._speed = 0.0  # Rate of the last move pulse on the leading axis, steps per second
+        self._braking = False  # The active table only slows the motor down before a reversal
+        self._priority = False  # A recenter move is running; ignore tracking commands
+        self._direction = None
+        self._tilt_direction = None
+        self._blocked = set()  # Directions whose limit switch has fired
+        self._pulsed_at = 0.0  # When the step pins last went high
+        self._limit_events = {pin: threading.Event() for pin in limit_pins or ()}  # Set on each switch's edge
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def start(self):
+        """Configures the pins and starts the engine thread."""
+        self.backend.setup_output(self.dir_pin)
+        self.backend.setup_output(self.step_pin)
+        if self.has_tilt:
+            self.backend.setup_output(self.tilt_dir_pin)
+            self.backend.setup_output(self.tilt_step_pin)
+        if self.limit_pins is not None:
+            for pin in self.limit_pins:
+                self.backend.setup_input(pin)
+                self.backend.on_falling_edge(pin, self._on_limit)
+                if not self.backend.input(pin):
+                    self._blocked.add(self._limit_direction(pin))
+        self._thread = threading.Thread(target=self._run, name="motion-engine")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def move(self, steps, rate=None):
+        """Retargets to `steps` away from the current position (negative is 'L')."""
+        self._commands.put(('move', int(steps), rate))
+
+    def move_to(self, position, rate=None):
+        """Retargets to an absolute step position, replacing any move in progress."""
+        self._commands.put(('move_to', int(position), rate))
+
+    def move_axes(self, pan_steps, tilt_steps, rate=None):
+        """
+        Moves both axes by a relative number of steps, starting and finishing together.
+
+        `rate` applies to the axis with more steps to go. Either axis may be
+        None to leave its current target (or jogging) alone.
+        """
+        self._commands.put(('move_axes', pan_steps, tilt_steps, rate, True))
+
+    def move_axes_to(self, pan, tilt, rate=None):
+        """Like move_axes, to absolute positions."""
+        self._commands.put(('move_axes', pan, tilt, rate, False))
+
+    def move_tilt(self, steps, rate=None):
+        """Retargets tilt to `steps` away from its current position (positive is up)."""
+        self.move_axes(None, int(steps), rate)
+
+    def set_velocity(self, steps_per_second):
+        """Steps pan continuously at a signed rate until stopped or given a move."""
+        self._commands.put(('velocity', float(steps_per_second)))
+
+    def set_tilt_velocity(self, steps_per_second):
+        """Steps tilt continuously at a signed rate until stopped or given a move."""
+        self._commands.put(('tilt_velocity', float(steps_per_second)))
+
+    def set_step_rate(self, steps_per_second):
+        """Sets the default rate used for move and move_to commands."""
+        self._commands.put(('rate', float(steps_per_second)))
+
+    def stop(self):
+        """Stops stepping after the current pulse."""
+        self._commands.put(('stop',))
+
+    def recenter(self, rate=RECENTER_RATE):
+        """Moves straight to the middle of the homed range; tracking commands wait until it is there."""
+        self._commands.put(('recenter', rate))
+
+    def shutdown(self, timeout=1.0):
+        """Stops the engine thread and waits for it to exit."""
+        self._commands.put(('shutdown',))
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def home(self, rate=HOMING_RATE, timeout=30.0):
+        """
+        Finds both limit switches and sets up absolute positioning. Blocks until done.
+
+        Runs left until the left switch closes (position 0), then right until
+        the right switch closes, which gives the span. Soft limits are set
+        SOFT_LIMIT_MARGIN steps inside each switch and the axis is moved to
+        the middle.
+
+        Raises:
+            RuntimeError: If there are no limit switches, a switch is not found
+                in time, or the switches are too close together for the soft limits.
+        """
+        if self.limit_pins is None:
+            raise RuntimeError("Homing needs limit switches")
+        self._commands.put(('unhome',))
+        self._seek(-1, rate, timeout)
+        self._commands.put(('set_position', 0))
+        self._seek(1, rate, timeout)
+        self.wait_idle(timeout)
+        span = self.position
+        if span <= 2 * SOFT_LIMIT_MARGIN:
+            raise RuntimeError(f"Limit switches only {span} steps apart; is a switch stuck or chattering?")
+        self._commands.put(('homed', span))
+        self.wait_idle(timeout)
+
+    @property
+    def has_tilt(self):
+        return self.tilt_step_pin is not None
+
+    @property
+    def limit_state(self):
+        """Closed limit switches as a bitmask: 1 for left, 2 for right; 0 without switches."""
+        if self.limit_pins is None:
+            return 0
+        left, right = self.limit_pins
+        return (not self.backend.input(left)) | (not self.backend.input(right)) << 1
+
+    @property
+    def busy(self):
+        return not self._idle.is_set()
+
+    def wait_idle(self, timeout=None):
+        """Blocks until every queued command has finished stepping."""
+        self._commands.join()
+        return self._idle.wait(timeout)
+
+    def _limit_direction(self, pin):
+        return -1 if pin == self.limit_pins[0] else 1
+
+    def _on_limit(self, pin):
+        # Runs on the GPIO callback thread: block the direction first, so the
+        # very next pulse toward the switch is refused, then tell the engine
+        self._blocked.add(self._limit_direction(pin))
+        self._limit_events[pin].set()
+        self._commands.put(('limit', self._limit_direction(pin)))
+
+    def _seek(self, direction, rate, timeout):
+        pin = self.limit_pins[0 if direction < 0 else 1]
+        if not self.backend.input(pin):
+            return  # Already sitting on the switch
+        event = self._limit_events[pin]
+        deadline = time.monotonic() + timeout
+        event.clear()
+        self.set_velocity(direction * rate)
+        # Done once the engine has stopped with this switch reading closed. A
+        # bounce on either switch can halt the jog short of it; jog on again
+        while True:
+            event.wait(max(0.0, min(SEEK_POLL, deadline - time.monotonic())))
+            event.clear()
+            self._commands.join()
+            if not self.busy:
+                if not self.backend.input(pin):
+                    time.sleep(LIMIT_BOUNCE_MS / 1000)  # A bounce has opened again by now
+                    if not self.backend.input(pin):
+                        return
+                self.set_velocity(direction * rate)
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError(f"Homing timed out looking for the limit switch on pin {pin}")
+
+    def _pending(self):
+        """
+        Returns (stream, interval) for everything that has a step to take.
+
+        'move' is the planned move (one or both axes, Bresenham-interleaved);
+        'pan' and 'tilt' are velocity jogging on an axis the move does not own.
+        """
+        pending = []
+        if self._move_active():
+            pending.append(('move', self._intervals[self._step_index]))
+        if self._velocity and self._target is None:
+            direction = 1 if self._velocity > 0 else -1
+            if self._within_soft_limits(self.position + direction):  # Otherwise hold at the limit
+                pending.append(('pan', 1.0 / min(abs(self._velocity), MAX_STEP_RATE)))
+        if self._tilt_velocity and self._tilt_target is None:
+            direction = 1 if self._tilt_velocity > 0 else -1
+            if self._within_tilt_limits(self.tilt_position + direction):
+                pending.append(('tilt', 1.0 / min(abs(self._tilt_velocity), MAX_STEP_RATE)))
+        return pending
+
+    def _move_active(self):
+        if self._target is None and self._tilt_target is None:
+            return False
+        pan_left = 0 if self._target is None else self._target - self.position
+        tilt_left = 0 if self._tilt_target is None else self._tilt_target - self.tilt_position
+        braking = self._braking and self._step_index < len(self._intervals)  # May run through the target
+        if pan_left == 0 and tilt_left == 0 and not braking:
+            self._target = self._tilt_target = None
+            self._intervals = None
+            self._priority = False
+            return False
+        if self._intervals is None or self._step_index >= len(self._intervals):
+            self._plan_move(pan_left, tilt_left)
+        return True
+
+    def _plan_move(self, pan_left, tilt_left):
+        """Plans the steps from the current positions and speed toward the targets."""
+        directions = ((pan_left > 0) - (pan_left < 0), (tilt_left > 0) - (tilt_left < 0))
+        rate = min(self._move_rate, MAX_STEP_RATE)
+        if self._braking:
+            self._speed = 0.0  # The brake ran down to the start rate; reverse from rest
+            self._braking = False
+        reversing = any(old and old != new for old, new in zip(self._path_directions, directions))
+        major = max(abs(pan_left), abs(tilt_left))
+        ramp = motion_profile.ramp_steps(self._speed, self.acceleration)  # Steps needed to stop
+        if (reversing and ramp) or major < ramp:
+            # Moving the other way on some axis, or too close to the target to stop
+            # in time: brake first, along the current path, down the back half of a
+            # ramp, then come back from rest
+            table = motion_profile.plan(2 * ramp, self._speed, self.acceleration, self.profile)
+            self._intervals = table[ramp:]
+            self._braking = True
+        else:
+            # Continuing the same way: join a fresh profile at the current speed.
+            # The profile is for the axis with more steps to go; the other axis
+            # steps along with it (Bresenham) so both arrive together
+            skip = motion_profile.ramp_steps(min(self._speed, rate), self.acceleration) if self._speed else 0
+            table = motion_profile.plan(major + skip, rate, self.acceleration, self.profile)
+            self._intervals = table[skip:]
+            self._path_directions = directions
+            self._path_counts = (abs(pan_left), abs(tilt_left))
+            self._path_errors = [major // 2, major // 2]
+        self._step_index = 0
+
+    def _path_step(self):
+        """Returns the (pan, tilt) directions to step on the next tick of the move."""
+        major = max(self._path_counts)
+        steps = []
+        for axis, count in enumerate(self._path_counts):
+            self._path_errors[axis] += count
+            if self._path_errors[axis] >= major:
+                self._path_errors[axis] -= major
+                steps.append(self._path_directions[axis])
+            else:
+                steps.append(0)
+        return steps
+
+    def _within_soft_limits(self, position):
+        return self.soft_limits is None or self.soft_limits[0] <= position <= self.soft_limits[1]
+
+    def _within_tilt_limits(self, position):
+        return self.tilt_limits[0] <= position <= self.tilt_limits[1]
+
+    def _clamp(self, position):
+        if self.soft_limits is None:
+            return position
+        return max(self.soft_limits[0], min(self.soft_limits[1], position))
+
+    def _clamp_tilt(self, position):
+        return max(self.tilt_limits[0], min(self.tilt_limits[1], position))
+
+    def _halt(self):
+        self._target = self._tilt_target = None
+        self._intervals = None
+        self._braking = False
+        self._velocity = self._tilt_velocity = 0.0
+        self._speed = 0.0
+        self._path_directions = (0, 0)
+        self._priority = False
+
+    def _apply(self, command):
+        kind = command[0]
+        if self._priority and kind in ('move', 'move_to', 'move_axes', 'velocity', 'tilt_velocity'):
+            return True  # Recentering; the tracking loop will catch up afterwards
+        if kind == 'move':
+            self._retarget(command[2] or self.step_rate, pan=self._clamp(self.position + command[1]))
+        elif kind == 'move_to':
+            self._retarget(command[2] or self.step_rate, pan=self._clamp(command[1]))
+        elif kind == 'move_axes':
+            pan, tilt, rate, relative = command[1:]
+            if pan is not None:
+                pan = self._clamp(pan + self.position if relative else pan)
+            if tilt is not None:
+                tilt = self._clamp_tilt(tilt + self.tilt_position if relative else tilt)
+            self._retarget(rate or self.step_rate, pan=pan, tilt=tilt)
+        elif kind == 'velocity':
+            if self._target is not None:
+                self._target = None
+                self._intervals = None  # A tilt move still running is replanned on its own
+            self._velocity = command[1]
+        elif kind == 'tilt_velocity':
+            if self._tilt_target is not None:
+                self._tilt_target = None
+                self._intervals = None
+            self._tilt_velocity = command[1]
+        elif kind == 'rate':
+            self.step_rate = max(1.0, command[1])
+        elif kind == 'stop':
+            self._halt()
+        elif kind == 'limit':
+            if self.backend.input(self.limit_pins[0 if command[1] < 0 else 1]):
+                # Released again: contact bounce as the switch opens (e.g. on the way back to
+                # center) fires edges past the debounce window; not a hit
+                self._blocked.discard(command[1])
+                return True
+            self._halt()
+            self.limit_hits += 1
+            if self.homed:
+                # The switch position is known exactly; use it to re-sync
+                self.position = 0 if command[1] < 0 else self.span
+                if self.recenter_on_limit:
+                    self._apply(('recenter', RECENTER_RATE))
+        elif kind == 'recenter':
+            if self.homed:
+                self._retarget(command[1], pan=self.span // 2, tilt=0 if self.has_tilt else None)
+                self._priority = True
+        elif kind == 'set_position':
+            self.position = command[1]
+        elif kind == 'unhome':
+            self.homed = False
+            self.soft_limits = None
+        elif kind == 'homed':
+            self.span = command[1]
+            self.soft_limits = (SOFT_LIMIT_MARGIN, self.span - SOFT_LIMIT_MARGIN)
+            self.homed = True
+            self._apply(('recenter', RECENTER_RATE))
+        return kind != 'shutdown'
+
+    def _retarget(self, rate, pan=None, tilt=None):
+        """Sets new targets; an axis given as None keeps the target it has."""
+        if pan is not None:
+            self._target = pan
+            self._velocity = 0.0
+        if tilt is not None:
+            self._tilt_target = tilt
+            self._tilt_velocity = 0.0
+        self._move_rate = rate
+        self._intervals = None  # Replanned from the current speed on the next step
+        self._braking = False
+
+    def _step(self, stream, interval):
+        if stream == 'move':
+            pan, tilt = self._path_step()
+            if self._pulse(pan, tilt):
+                self._speed = 1.0 / interval if interval else motion_profile.START_RATE
+                self._step_index += 1
+        elif stream == 'pan':
+            direction = 1 if self._velocity > 0 else -1
+            if self._pulse(direction, 0):
+                self._speed = 1.0 / interval
+                self._path_directions = (direction, 0)
+        else:
+            self._pulse(0, 1 if self._tilt_velocity > 0 else -1)
+
+    def _pulse(self, pan, tilt):
+        """
+        Issues one step on each axis given a direction (0 leaves an axis alone).
+
+        Pan is refused, and everything stopped, when it would drive into a
+        pressed limit switch.
+        """
+        if pan in self._blocked:
+            pin = self.limit_pins[0 if pan < 0 else 1]
+            if not self.backend.input(pin):
+                self._halt()
+                return False
+            self._blocked.discard(pan)  # Switch has been released
+        if pan and pan != self._direction:
+            self.backend.output(self.dir_pin, pan > 0)
+            self._direction = pan
+        if tilt and tilt != self._tilt_direction:
+            self.backend.output(self.tilt_dir_pin, tilt > 0)
+            self._tilt_direction = tilt
+        with pulse_stage:
+            # Both step pins go high together, so a coordinated step is one pulse
+            self._pulsed_at = time.perf_counter()
+            if pan:
+                self.backend.output(self.step_pin, True)
+            if tilt:
+                self.backend.output(self.tilt_step_pin, True)
+            time.sleep(PULSE_WIDTH)
+            if pan:
+                self.backend.output(self.step_pin, False)
+            if tilt:
+                self.backend.output(self.tilt_step_pin, False)
+        self.position += pan
+        self.tilt_position += tilt
+        self.steps_issued += (pan != 0) + (tilt != 0)
+        motion_rate.tick()
+        return True
+
+    def _run(self):
+        realtime.pin_thread(self.cpus)
+        realtime.set_fifo(self.priority)
+        deadlines = {}  # Stream -> when its last pulse was due
+        last_pulses = {}  # Stream -> when its last pulse actually went out
+        while True:
+            pending = self._pending()
+            if not pending:
+                self._idle.set()
+                self._speed = 0.0
+                timeout = None  # Nothing to do; sleep until a command arrives
+            else:
+                self._idle.clear()
+                # Each stream is due one interval after its previous deadline, not
+                # after its previous pulse actually went out, so wake-up latency
+                # does not add up; the earliest stream goes next
+                now = time.perf_counter()
+                due, stream, interval = min(
+                    (self._due(name, step_interval, deadlines, last_pulses, now), name, step_interval)
+                    for name, step_interval in pending)
+                timeout = max(0.0, due - now)
+            for name in list(deadlines):
+                if all(name != stream_name for stream_name, _ in pending):
+                    del deadlines[name]  # Stopped; a restart begins a fresh schedule
+
+            try:
+                command = self._commands.get(timeout=timeout)
+            except queue.Empty:
+                command = None
+
+            if command is not None:
+                running = self._apply(command)
+                if self._pending():
+                    self._idle.clear()  # Before task_done so wait_idle cannot slip through
+                self._commands.task_done()
+                if not running:
+                    break
+                continue
+
+            now = time.perf_counter()
+            lateness = now - due
+            if lateness > MAX_LATENESS:
+                # Preempted or overloaded: restart the schedule rather than burst to catch up
+                self.late_pulses += 1
+                due = now
+            self.max_lateness = max(self.max_lateness, lateness)
+            if metrics.enabled:
+                lateness_stage.observe(max(0.0, lateness))
+            deadlines[stream] = due
+            self._step(stream, interval)
+            last_pulses[stream] = self._pulsed_at
+
+        self._halt()
+        self._idle.set()
+
+    @staticmethod
+    def _due(stream, interval, deadlines, last_pulses, now):
+        deadline = deadlines.get(stream)
+        if deadline is None:
+            return now
+        # Making up for a late pulse must not step faster than the motor can follow,
+        # nor faster than the pulse width allows
+        return max(deadline + interval, last_pulses[stream] + max(MIN_GAP * interval, 1.0 / MAX_STEP_RATE))
+
+
+engine = None  # MotionEngine started by setup_motor_gpio
+
+
+def setup_motor_gpio(backend=None):
+    """
+    Initializes GPIO pins for the motor and starts the motion engine.
+
+    Args:
+        backend: Pin backend to drive. Defaults to the real GPIO header, or to
+            a SimulatedBackend when RPi.GPIO is not installed.
+    """
+    global engine
+    if engine is not None:
+        return engine
+    if backend is None:
+        if GPIO is None:
+            print("Warning: RPi.GPIO not available, using simulated motor backend")
+            backend = SimulatedBackend()
+            backend.add_travel(STEP_PIN, DIR_PIN, LIMIT_LEFT_PIN, LIMIT_RIGHT_PIN, -800, 800)
+        else:
+            backend = GPIOBackend()
+    engine = MotionEngine(backend, limit_pins=(LIMIT_LEFT_PIN, LIMIT_RIGHT_PIN),
+                          tilt_pins=(TILT_DIR_PIN, TILT_STEP_PIN))
+    engine.start()
+    return engine
+
+
+def home_motor(timeout=30.0):
+    """
+    Homes the pan axis against its limit switches; see MotionEngine.home.
+
+    Returns:
+        bool: True if homing succeeded. On failure the turret keeps working
+        without soft limits.
+    """
+    if engine is None:
+        setup_motor_gpio()
+    try:
+        engine.home(timeout=timeout)
+    except RuntimeError as error:
+        print(f"Error: {error}; continuing without soft limits")
+        return False
+    print(f"Homed: {engine.span} steps between limit switches")
+    return True
+
+
+def recenter_motor():
+    """Moves the turret back to the middle of its homed range."""
+    if engine is not None:
+        engine.recenter()
 
-def setup_motor_gpio():
-    """Initializes GPIO pins for the motor."""
-    GPIO.setmode(GPIO.BCM)
-    GPIO.setup(DIR_PIN, GPIO.OUT)
-    GPIO.setup(STEP_PIN, GPIO.OUT)
 
 def move_motor(step_size, direction):
     """
-    Moves the stepper motor in the specified direction.
-    
+    Hands a move to the motion engine and returns without waiting for it.
+
+    A new call retargets any move still in progress, so the latest
+    correction from the vision loop always wins.
+
     Args:
         step_size (int): Number of steps to move.
         direction (str): 'R' for right, 'L' for left.
     """
-    GPIO.output(DIR_PIN, GPIO.HIGH if direction == 'R' else GPIO.LOW)
-    for _ in range(step_size):
-        GPIO.output(STEP_PIN, GPIO.HIGH)
-        time.sleep(0.001)
-        GPIO.output(STEP_PIN, GPIO.LOW)
-        time.sleep(0.001)
+    if engine is None:
+        setup_motor_gpio()
+    engine.move(step_size if direction == 'R' else -step_size)
+
+
+def move_motors(pan_steps, tilt_steps):
+    """
+    Hands a coordinated pan/tilt move to the motion engine and returns without waiting.
+
+    Both axes start and finish together; positive pan is right, positive tilt is up.
+    """
+    if engine is None:
+        setup_motor_gpio()
+    engine.move_axes(pan_steps, tilt_steps)
+
+
+def wait_for_motor(timeout=None):
+    """Blocks until the motion engine has finished all queued moves."""
+    if engine is not None:
+        return engine.wait_idle(timeout)
+    return True
+
 
 def cleanup_motor_gpio():
-    """Cleans up GPIO pins."""
-    GPIO.cleanup()
+    """Stops the motion engine and cleans up GPIO pins."""
+    global engine
+    if engine is not None:
+        engine.shutdown()
+        engine.backend.cleanup()
+        engine = None
+    elif GPIO is not None:
+        GPIO.cleanup()
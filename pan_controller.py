@@ -0,0 +1,150 @@
+import threading
+import time
+
+import metrics
+from realtime import DeadlineMonitor
+
+# Default tuning, in motor steps per second per pixel of error
+CONTROL_RATE = 200  # Control loop rate in Hz
+PAN_KP = 6.0
+PAN_KI = 0.5
+PAN_KD = 0.25
+DEADBAND = 4  # Pixels of error treated as centered
+MAX_VELOCITY = 1500  # Steps per second
+MAX_ACCEL = 6000  # Steps per second squared
+
+
+class PID:
+    """
+    PID on a pixel error with integral anti-windup.
+
+    The integral is clamped so it can never ask for more than the output
+    limit on its own, and it is frozen while the output is saturated in the
+    direction the error is pushing (conditional integration). The derivative
+    is taken on a low-pass filtered error.
+    """
+
+    def __init__(self, kp, ki, kd, output_limit, derivative_smoothing=0.3):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_limit = output_limit
+        self.derivative_smoothing = derivative_smoothing
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self._previous_error = None
+        self._derivative = 0.0
+
+    def update(self, error, dt):
+        if self._previous_error is not None and dt > 0:
+            raw = (error - self._previous_error) / dt
+            self._derivative += self.derivative_smoothing * (raw - self._derivative)
+        self._previous_error = error
+
+        unclamped = self.kp * error + self.ki * self.integral + self.kd * self._derivative
+        saturated = abs(unclamped) >= self.output_limit and (unclamped > 0) == (error > 0)
+        if not saturated and self.ki:
+            self.integral += error * dt
+            limit = self.output_limit / self.ki
+            self.integral = max(-limit, min(limit, self.integral))
+
+        output = self.kp * error + self.ki * self.integral + self.kd * self._derivative
+        return max(-self.output_limit, min(self.output_limit, output))
+
+
+class PanController:
+    """
+    Fixed-rate pan loop that turns the estimated target error into motor velocity.
+
+    Runs at `rate_hz` on its own thread regardless of the camera frame rate.
+    Each tick it reads the latest error estimate from `error_source` (pixels,
+    positive when the target is right of center, None when there is no
+    track), runs the PID, applies the deadband and the velocity/acceleration
+    limits, and sends the result to the motion engine as a velocity command.
+    An optional `feedforward` source adds the velocity needed to keep up with
+    a moving target, so the integral only has to trim what is left.
+    `tick()` can also be driven by hand, e.g. from a simulation.
+
+    With `axis='tilt'` the same loop drives the engine's tilt axis instead,
+    from a tilt error source.
+    """
+
+    def __init__(self, engine, error_source, rate_hz=CONTROL_RATE, kp=PAN_KP, ki=PAN_KI, kd=PAN_KD,
+                 deadband=DEADBAND, max_velocity=MAX_VELOCITY, max_accel=MAX_ACCEL, feedforward=None, axis='pan'):
+        self.engine = engine
+        self.axis = axis
+        self._set_velocity = engine.set_tilt_velocity if axis == 'tilt' else engine.set_velocity
+        self.error_source = error_source
+        self.feedforward = feedforward
+        self.rate_hz = rate_hz
+        self.pid = PID(kp, ki, kd, max_velocity)
+        self.deadband = deadband
+        self.max_velocity = max_velocity
+        self.max_accel = max_accel
+        self.velocity = 0.0  # Last commanded velocity, steps per second
+        self.error = None
+        self.deadlines = DeadlineMonitor(f'{axis}_control')  # Ticks that finished after their slot
+        self.ticks = metrics.rate(f'{axis}_control', f"Ticks of the fixed-rate {axis} controller")
+        self._sent = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=f"{self.axis}-controller")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.velocity = 0.0
+        self._send(0.0)
+
+    def tick(self, dt, now=None):
+        """Runs one control step of length `dt` seconds and returns the commanded velocity."""
+        error = self.error_source(now)
+        self.error = error
+        if error is None:
+            self.pid.reset()
+            desired = 0.0
+        elif abs(error) <= self.deadband:
+            self.pid.reset()  # Centered; do not let the integral creep
+            desired = 0.0
+        else:
+            # Shift the error by the deadband so the output starts from zero at its edge
+            error -= self.deadband if error > 0 else -self.deadband
+            desired = self.pid.update(error, dt)
+        if error is not None and self.feedforward is not None:
+            desired += self.feedforward(now)
+
+        desired = max(-self.max_velocity, min(self.max_velocity, desired))
+        max_change = self.max_accel * dt
+        self.velocity += max(-max_change, min(max_change, desired - self.velocity))
+        self._send(self.velocity)
+        return self.velocity
+
+    def _send(self, velocity):
+        velocity = round(velocity, 1)
+        if velocity != self._sent:
+            self._set_velocity(velocity)
+            self._sent = velocity
+
+    def _run(self):
+        period = 1.0 / self.rate_hz
+        deadline = time.monotonic()
+        while self._running:
+            deadline += period
+            self.tick(period)
+            self.ticks.tick()
+            delay = deadline - time.monotonic()
+            self.deadlines.observe(-delay)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()  # Fell behind; do not try to catch up with a burst
@@ -0,0 +1,95 @@
+import os
+
+import metrics
+
+
+def _cpus(name):
+    value = os.environ.get(name, '').strip()
+    return {int(cpu) for cpu in value.split(',') if cpu.strip()} if value else None
+
+
+# Runtime configuration for the real-time loops, all off by default. On a 4-core Pi
+# e.g. ABRS_MOTION_CPUS=3 ABRS_VISION_CPUS=2 ABRS_MOTION_FIFO=50 ABRS_CV_THREADS=2
+# leaves cores 0-1 to Flask, pygame and the rest.
+MOTION_CPUS = _cpus('ABRS_MOTION_CPUS')  # Cores the motion engine thread is pinned to
+VISION_CPUS = _cpus('ABRS_VISION_CPUS')  # Cores the vision loop (and OpenCV's workers it starts) run on
+MOTION_PRIORITY = int(os.environ.get('ABRS_MOTION_FIFO', '0'))  # SCHED_FIFO priority, 1-99; 0 keeps SCHED_OTHER
+CV_THREADS = int(os.environ.get('ABRS_CV_THREADS', '-1'))  # OpenCV thread pool size; -1 leaves OpenCV's default
+
+
+def pin_thread(cpus):
+    """
+    Pins the calling thread to `cpus` (a set of core numbers); None leaves it alone.
+
+    Threads started from it afterwards, e.g. OpenCV's pool, inherit the
+    mask. Returns whether the affinity was set; a platform without
+    sched_setaffinity or an invalid core only prints a warning.
+    """
+    if not cpus:
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)  # 0 is the calling thread on Linux
+    except (AttributeError, OSError) as error:
+        print(f"Warning: could not pin thread to CPUs {sorted(cpus)}: {error}")
+        return False
+    return True
+
+
+def set_fifo(priority):
+    """
+    Moves the calling thread to SCHED_FIFO at `priority`; 0 leaves it alone.
+
+    Needs root or CAP_SYS_NICE. Returns whether it worked; a refusal only
+    prints a warning, and the thread keeps running at normal priority.
+    """
+    if priority <= 0:
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except (AttributeError, OSError) as error:
+        print(f"Warning: could not set SCHED_FIFO priority {priority}: {error}")
+        return False
+    return True
+
+
+def configure_opencv(threads=CV_THREADS):
+    """Caps OpenCV's worker thread pool, so it cannot crowd the motion core; -1 leaves the default."""
+    if threads < 0:
+        return
+    import cv2  # Only the vision side needs OpenCV; the motion engine imports this module too
+    cv2.setNumThreads(threads)
+
+
+class DeadlineMonitor:
+    """
+    Counts how often a periodic loop misses its deadline, and by how much.
+
+    The loop passes how late each iteration finished against its deadline
+    (negative when early) to observe(). Anything later than `tolerance`
+    is a miss. `misses` and `max_lateness` are exposed on /metrics as
+    <name>_deadline_misses_total and <name>_max_lateness_seconds.
+    """
+
+    def __init__(self, name, tolerance=0.0):
+        self.name = name
+        self.tolerance = tolerance
+        self.checks = 0
+        self.misses = 0
+        self.max_lateness = 0.0
+        metrics.register_value(f'{name}_deadline_misses_total', lambda: self.misses,
+                               f"Iterations of the {name} loop that missed their deadline", kind='counter')
+        metrics.register_value(f'{name}_max_lateness_seconds', lambda: self.max_lateness,
+                               f"Worst lateness of the {name} loop against its deadline")
+
+    def observe(self, lateness):
+        """Records one iteration; returns True if it was a miss."""
+        self.checks += 1
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        if lateness > self.tolerance:
+            self.misses += 1
+            return True
+        return False
+
+    def stats(self):
+        return {'checks': self.checks, 'misses': self.misses, 'max_lateness': self.max_lateness}
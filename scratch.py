@@ -0,0 +1,31 @@
+import numpy as np
+
+
+class Scratch:
+    """
+    Named, grow-only work buffers for hot loops.
+
+    get() hands out a C-contiguous array of the requested shape backed by
+    the front of a flat buffer, so OpenCV can write into it through `dst=`.
+    A buffer is only reallocated when a request outgrows it (e.g. the
+    resolution went up); smaller requests, like a search window that
+    changes size every frame, reuse it.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Returns a `shape` array on buffer `name`; its contents are whatever was there before."""
+        size = 1
+        for dim in shape:
+            size *= dim
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(max(size, 1), dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def nbytes(self):
+        """Total size of every buffer held."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
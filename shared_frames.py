@@ -0,0 +1,201 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from target_detection import Detection
+
+# Per-slot bookkeeping kept in shared memory next to the pixels
+_SLOT = np.dtype([
+    ('seq', 'i8'),  # -1 while the slot is being written
+    ('time', 'f8'),  # Capture time, time.monotonic() seconds (system-wide on Linux)
+    ('pins', 'i4'),  # Readers currently holding the slot
+    ('taken', 'i1'),  # Acquired by a reader at least once
+    ('found', 'i1'),
+    ('target', 'i4', (6,)),  # Detection x, y, w, h, center_x, center_y
+    ('area', 'f8'),
+])
+# Ring-wide counters after the slot table
+_LATEST, _WRITTEN, _DROPPED, _CLOSED = range(4)
+
+
+class SharedFrame:
+    """
+    A frame checked out of a SharedFrameRing.
+
+    `frame` and `mask` are views straight into shared memory; they stay valid
+    until release() is called, after which the writer may reuse the slot.
+    """
+
+    def __init__(self, ring, index):
+        self.ring = ring
+        self.index = index
+        slot = ring._slots[index]
+        self.seq = int(slot['seq'])
+        self.timestamp = float(slot['time'])
+        self.target = Detection(*(int(v) for v in slot['target']), float(slot['area'])) if slot['found'] else None
+        self.frame = ring.frame(index)
+        self.mask = ring.mask(index)
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.ring.release(self.index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SharedFrameRing:
+    """
+    Latest-frame-wins ring of frames and masks in multiprocessing.shared_memory.
+
+    One writer process claims a free slot, fills it in place (the camera
+    reads straight into it), and commits it together with its detection.
+    Any number of readers in other processes acquire the newest committed
+    slot, which pins it so the writer will not reuse it until they release
+    it. Only the slot index and a few numbers cross the process boundary;
+    the pixels are never copied or pickled.
+
+    Keep `slots` at least 2 more than the number of frames readers may pin
+    at once (one slot being written, one holding the latest frame).
+    """
+
+    def __init__(self, shape, slots=5, context=None):
+        if slots < 3:
+            raise ValueError("SharedFrameRing needs at least 3 slots (writing, latest, reading)")
+        context = context or multiprocessing
+        self.shape = tuple(shape)
+        self.slots = slots
+        frame_bytes = int(np.prod(self.shape))
+        mask_bytes = self.shape[0] * self.shape[1]
+        self._owner = True
+        self._shm = [
+            shared_memory.SharedMemory(create=True, size=slots * frame_bytes),
+            shared_memory.SharedMemory(create=True, size=slots * mask_bytes),
+            shared_memory.SharedMemory(create=True, size=slots * _SLOT.itemsize + 4 * 8),
+        ]
+        self._cond = context.Condition()
+        self._attach()
+        self._slots['seq'] = -1
+        self._slots['pins'] = 0
+        self._slots['found'] = 0
+        self._state[:] = 0
+        self._state[_LATEST] = -1
+
+    def _attach(self):
+        frames, masks, meta = self._shm
+        self._frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=frames.buf)
+        self._masks = np.ndarray((self.slots,) + self.shape[:2], dtype=np.uint8, buffer=masks.buf)
+        self._slots = np.ndarray((self.slots,), dtype=_SLOT, buffer=meta.buf)
+        self._state = np.ndarray((4,), dtype=np.int64, buffer=meta.buf, offset=self.slots * _SLOT.itemsize)
+
+    def __getstate__(self):
+        # For spawned processes: send the segment names, not the memory
+        return {'shape': self.shape, 'slots': self.slots, 'names': [shm.name for shm in self._shm],
+                'cond': self._cond}
+
+    def __setstate__(self, state):
+        self.shape = state['shape']
+        self.slots = state['slots']
+        self._owner = False
+        self._shm = [shared_memory.SharedMemory(name=name) for name in state['names']]
+        self._cond = state['cond']
+        self._attach()
+
+    def frame(self, index):
+        return self._frames[index]
+
+    def mask(self, index):
+        return self._masks[index]
+
+    @property
+    def closed(self):
+        return bool(self._state[_CLOSED])
+
+    def claim(self, timeout=None):
+        """
+        Returns the index of a slot the writer may fill, or None on timeout or close.
+
+        The slot is neither the latest frame nor pinned by a reader.
+        """
+        with self._cond:
+            found = self._cond.wait_for(lambda: self.closed or self._free_slot() is not None, timeout)
+            if not found or self.closed:
+                return None
+            index = self._free_slot()
+            self._slots[index]['seq'] = -1
+            self._slots[index]['taken'] = 0
+            return index
+
+    def commit(self, index, seq, timestamp, target=None):
+        """Publishes a filled slot as the newest frame, with its Detection (or None)."""
+        with self._cond:
+            slot = self._slots[index]
+            slot['time'] = timestamp
+            slot['found'] = target is not None
+            if target is not None:
+                slot['target'] = target[:6]
+                slot['area'] = target.area
+            slot['seq'] = seq
+            latest = self._state[_LATEST]
+            if latest >= 0 and not self._slots[latest]['taken']:
+                self._state[_DROPPED] += 1  # Replaced before any reader took it
+            self._state[_LATEST] = index
+            self._state[_WRITTEN] += 1
+            self._cond.notify_all()
+
+    def acquire(self, after_seq=-1, timeout=None):
+        """
+        Pins and returns the newest frame as a SharedFrame.
+
+        Args:
+            after_seq (int): Wait for a frame with a sequence number greater than this.
+            timeout (float): Seconds to wait before giving up and returning None.
+        """
+        with self._cond:
+            ready = self._cond.wait_for(lambda: self.closed or self._latest_seq() > after_seq, timeout)
+            if not ready or self.closed:
+                return None
+            index = int(self._state[_LATEST])
+            self._slots[index]['pins'] += 1
+            self._slots[index]['taken'] = 1
+            return SharedFrame(self, index)
+
+    def release(self, index):
+        with self._cond:
+            self._slots[index]['pins'] -= 1
+            self._cond.notify_all()
+
+    def close(self):
+        """Wakes every waiting reader and writer; claim() and acquire() return None from now on."""
+        with self._cond:
+            self._state[_CLOSED] = 1
+            self._cond.notify_all()
+
+    def stats(self):
+        return {'written': int(self._state[_WRITTEN]), 'dropped': int(self._state[_DROPPED])}
+
+    def unlink(self):
+        """Detaches from the shared memory, and frees it if this is the ring that created it."""
+        self._frames = self._masks = self._slots = self._state = None
+        for shm in self._shm:
+            shm.close()
+            if self._owner:
+                shm.unlink()
+
+    def _latest_seq(self):
+        latest = self._state[_LATEST]
+        return self._slots[latest]['seq'] if latest >= 0 else -1
+
+    def _free_slot(self):
+        latest = self._state[_LATEST]
+        for offset in range(1, self.slots + 1):
+            index = (latest + offset) % self.slots
+            if index != latest and self._slots[index]['pins'] == 0:
+                return index
+        return None
@@ -0,0 +1,48 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+START = time.monotonic()  # Import this module first so the clock starts with the program
+_marks = {}  # Milestone -> seconds since START
+_lock = threading.Lock()
+
+MENU = 'menu shown'
+FIRST_TRACK = 'first tracked frame'
+
+
+def mark(name):
+    """Records and prints the first time a milestone is reached; returns seconds since startup."""
+    with _lock:
+        if name in _marks:
+            return _marks[name]
+        elapsed = time.monotonic() - START
+        _marks[name] = elapsed
+    print(f"Startup: {name} at {elapsed:.3f} s")
+    return elapsed
+
+
+@contextmanager
+def step(name):
+    """Times one initialization step and prints how long it took and when it finished."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        end = time.monotonic()
+        with _lock:
+            _marks.setdefault(name, end - START)
+        print(f"Startup: {name} took {end - start:.3f} s (done at {end - START:.3f} s)")
+
+
+def marks():
+    """Returns every recorded milestone, in seconds since startup."""
+    with _lock:
+        return dict(_marks)
+
+
+metrics.register_value('startup_menu_seconds', lambda: _marks.get(MENU),
+                       "Seconds from program start until the menu was on screen")
+metrics.register_value('startup_first_track_seconds', lambda: _marks.get(FIRST_TRACK),
+                       "Seconds from program start until the first frame with a tracked target")
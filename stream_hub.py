@@ -0,0 +1,142 @@
+import itertools
+import threading
+import time
+
+
+class StreamClient:
+    """
+    One viewer of a StreamHub.
+
+    `next_frame()` blocks until a frame newer than the last one it returned
+    has been published. A client that falls behind simply gets the newest
+    frame; whatever it missed is added to `dropped`.
+    """
+
+    def __init__(self, hub, client_id):
+        self.hub = hub
+        self.client_id = client_id
+        self.last_seq = -1
+        self.delivered = 0
+        self.dropped = 0
+        self.lag = 0.0  # Seconds between publish and hand-off for the last frame
+        self.max_lag = 0.0
+        self.connected_at = time.monotonic()
+
+    def next_frame(self, timeout=None):
+        """Returns (sequence, data) for the newest frame, or None on timeout or close."""
+        hub = self.hub
+        with hub._cond:
+            ready = hub._cond.wait_for(lambda: hub._closed or hub._seq > self.last_seq, timeout)
+            if not ready or hub._closed:
+                return None
+            seq, data, published_at = hub._seq, hub._data, hub._published_at
+        if self.last_seq >= 0:
+            self.dropped += seq - self.last_seq - 1
+        self.last_seq = seq
+        self.delivered += 1
+        self.lag = time.monotonic() - published_at
+        self.max_lag = max(self.max_lag, self.lag)
+        return seq, data
+
+    def stats(self):
+        return {
+            'id': self.client_id,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'behind': max(0, self.hub._seq - self.last_seq),
+            'lag': self.lag,
+            'max_lag': self.max_lag,
+        }
+
+    def close(self):
+        self.hub._remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StreamHub:
+    """
+    Broadcasts encoded frames from the vision thread to any number of viewers.
+
+    The producer publishes each frame exactly once; publishing only swaps a
+    reference and wakes waiting clients, so slow viewers can never hold up
+    the vision loop. Listeners added with add_listener() are also called on
+    every publish and on close, from the publishing thread, so they must
+    only hand the news on (e.g. loop.call_soon_threadsafe), never block.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = -1
+        self._data = None
+        self._published_at = 0.0
+        self._closed = False
+        self._clients = {}
+        self._ids = itertools.count()
+        self._listeners = ()
+
+    def publish(self, data):
+        """Makes `data` the newest frame and wakes every waiting client."""
+        with self._cond:
+            self._seq += 1
+            self._data = data
+            self._published_at = time.monotonic()
+            self._cond.notify_all()
+            seq = self._seq
+        for listener in self._listeners:
+            listener()
+        return seq
+
+    def add_listener(self, callback):
+        """Calls `callback()` after every publish and on close."""
+        with self._cond:
+            self._listeners += (callback,)
+
+    def remove_listener(self, callback):
+        with self._cond:
+            self._listeners = tuple(listener for listener in self._listeners if listener is not callback)
+
+    def subscribe(self):
+        """Registers a new viewer; use it as a context manager or call close()."""
+        with self._cond:
+            client = StreamClient(self, next(self._ids))
+            self._clients[client.client_id] = client
+            return client
+
+    def close(self):
+        """Releases every waiting client, e.g. when the vision loop stops."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def reopen(self):
+        with self._cond:
+            self._closed = False
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def subscriber_count(self):
+        return len(self._clients)
+
+    @property
+    def sequence(self):
+        return self._seq
+
+    def stats(self):
+        """Returns the published frame count and per-client lag and drop counters."""
+        with self._cond:
+            clients = list(self._clients.values())
+        return {'published': self._seq + 1, 'clients': [client.stats() for client in clients]}
+
+    def _remove(self, client):
+        with self._cond:
+            self._clients.pop(client.client_id, None)
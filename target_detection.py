@@ -0,0 +1,262 @@
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+import metrics
+from color_lut import HsvThreshold, LutThreshold
+from scratch import Scratch
+
+threshold_stage = metrics.stage('threshold', "Colour thresholding of the searched window")
+contour_stage = metrics.stage('contours', "Contour search of the mask")
+
+METHODS = ('contour', 'pyramid')
+
+# Bounding box, centroid and area of a detected target, in frame coordinates. The
+# 'contour' method gives the bbox centre and contour area; 'pyramid' gives the
+# sub-pixel pixel centroid (image moments) and the pixel count.
+Detection = namedtuple('Detection', ['x', 'y', 'w', 'h', 'center_x', 'center_y', 'area'])
+
+
+def find_largest_blob(mask, min_area, offset=(0, 0)):
+    """
+    Returns the largest external contour in a mask as a Detection.
+
+    Args:
+        mask: Binary mask to search.
+        min_area (float): Contours with an area at or below this are ignored.
+        offset (tuple): (x, y) added to the result when `mask` is a crop of the frame.
+    """
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset)
+    if not contours:
+        return None
+    largest_contour = max(contours, key=cv2.contourArea)
+    area = cv2.contourArea(largest_contour)
+    if area <= min_area:
+        return None
+    x, y, w, h = cv2.boundingRect(largest_contour)
+    return Detection(x, y, w, h, x + w // 2, y + h // 2, area)
+
+
+def _largest_component(mask, labels=None):
+    """Returns (stats row, centroid) of the largest 8-connected blob in a mask, or None."""
+    count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, labels=labels, connectivity=8)
+    if count < 2:
+        return None
+    label = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))  # Label 0 is the background
+    return stats[label], centroids[label]
+
+
+def refine_largest_blob(frame, coarse_mask, threshold, min_area, offset=(0, 0), scratch=None):
+    """
+    Returns the largest blob of a coarse mask, measured again at full resolution, as a Detection.
+
+    The largest connected component of `coarse_mask` (a thresholded,
+    downsampled copy of `frame`) picks the blob. Only its bounding box, plus
+    one coarse pixel each side, is thresholded at full resolution, and the
+    centroid there is the mean of the blob's pixels (its first image
+    moments), to sub-pixel precision.
+
+    Args:
+        frame: BGR image the coarse mask was made from.
+        coarse_mask: Binary mask of `frame` downsampled.
+        threshold: Callable returning the binary mask of a BGR image.
+        min_area (float): Blobs of this many full-resolution pixels or fewer are ignored.
+        offset (tuple): (x, y) added to the result when `frame` is a crop.
+        scratch (Scratch): Buffers for the label images and the fine mask.
+    """
+    scratch = scratch or Scratch()
+    coarse = _largest_component(coarse_mask, scratch.get('labels', coarse_mask.shape, np.int32))
+    if coarse is None:
+        return None
+    height, width = frame.shape[:2]
+    scale_x = width / coarse_mask.shape[1]
+    scale_y = height / coarse_mask.shape[0]
+    stats = coarse[0]
+    if stats[cv2.CC_STAT_AREA] * scale_x * scale_y <= min_area:
+        return None
+    x0 = max(0, int((stats[cv2.CC_STAT_LEFT] - 1) * scale_x))
+    y0 = max(0, int((stats[cv2.CC_STAT_TOP] - 1) * scale_y))
+    x1 = min(width, int(np.ceil((stats[cv2.CC_STAT_LEFT] + stats[cv2.CC_STAT_WIDTH] + 1) * scale_x)))
+    y1 = min(height, int(np.ceil((stats[cv2.CC_STAT_TOP] + stats[cv2.CC_STAT_HEIGHT] + 1) * scale_y)))
+
+    fine_shape = (y1 - y0, x1 - x0)
+    fine_mask = threshold(frame[y0:y1, x0:x1], dst=scratch.get('fine', fine_shape))
+    fine = _largest_component(fine_mask, scratch.get('labels', fine_shape, np.int32))
+    if fine is None:
+        return None
+    stats, (center_x, center_y) = fine
+    area = int(stats[cv2.CC_STAT_AREA])
+    if area <= min_area:
+        return None
+    x = int(stats[cv2.CC_STAT_LEFT]) + x0 + offset[0]
+    y = int(stats[cv2.CC_STAT_TOP]) + y0 + offset[1]
+    return Detection(x, y, int(stats[cv2.CC_STAT_WIDTH]), int(stats[cv2.CC_STAT_HEIGHT]),
+                     float(center_x) + x0 + offset[0], float(center_y) + y0 + offset[1], area)
+
+
+class RedTargetDetector:
+    """
+    Finds the red target in BGR frames.
+
+    With tracking enabled, once the target has been found only a window
+    around its last bounding box is thresholded and searched. The window
+    grows with how fast the target has been moving. A full-frame search is
+    used again after `max_misses` frames without a hit, or right away when
+    the target touches the window edge (it may have been cut off).
+
+    Thresholding uses cvtColor + inRange, or with `use_lut` a cached,
+    quantized BGR lookup table (see color_lut). Either way the hue range
+    may wrap past 180.
+
+    `method` selects how the searched region is turned into a Detection:
+    'contour' finds the largest contour at full resolution and uses its
+    bounding box centre; 'pyramid' thresholds a copy downsampled by
+    `pyramid_scale`, picks the largest blob there and measures only that
+    blob at full resolution (see refine_largest_blob). The mask kept for
+    display is then the coarse one.
+
+    Masks, the downsampled copy and label images are written through
+    `dst=` into grow-only Scratch buffers, so steady-state detection
+    allocates no images; `mask` is only valid until the next detect().
+    """
+
+    def __init__(self, lower, upper, min_area, tracking=True, max_misses=3,
+                 base_margin=16, motion_gain=2.0, edge_margin=4, history=5, use_lut=False,
+                 method='contour', pyramid_scale=2):
+        if method not in METHODS:
+            raise ValueError(f"Unknown detection method {method!r}; expected one of {METHODS}")
+        self.lower = tuple(lower)
+        self.upper = tuple(upper)
+        self.lut = LutThreshold(lower, upper) if use_lut else None
+        self.hsv = None if use_lut else HsvThreshold(lower, upper)
+        self._scratch = Scratch()
+        self.min_area = min_area
+        self.tracking = tracking
+        self.max_misses = max_misses
+        self.base_margin = base_margin
+        self.motion_gain = motion_gain
+        self.edge_margin = edge_margin
+        self.method = method
+        self.pyramid_scale = pyramid_scale
+
+        self.mask = None  # Mask from the last search; covers `window`
+        self.window = None  # (x0, y0, x1, y1) searched on the last frame
+        self.last = None  # Last Detection, kept while the target is locked
+        self.misses = 0
+        self.full_searches = 0
+        self.window_searches = 0
+        self._motion = deque(maxlen=history)  # Recent (|dx|, |dy|) of the target centre
+
+    def reset(self):
+        """Drops the lock so the next frame gets a full-frame search."""
+        self.last = None
+        self.misses = 0
+        self._motion.clear()
+
+    def set_thresholds(self, lower, upper):
+        """Changes the HSV thresholds; the lookup table is rebuilt only if they differ."""
+        self.lower = tuple(lower)
+        self.upper = tuple(upper)
+        if self.lut is not None:
+            self.lut.set_thresholds(lower, upper)
+        else:
+            self.hsv.set_thresholds(lower, upper)
+
+    def threshold(self, frame, dst=None):
+        """Returns the binary mask of target-coloured pixels in a BGR image, written to `dst` if given."""
+        if self.lut is not None:
+            return self.lut(frame, dst=dst)
+        return self.hsv(frame, dst=dst)
+
+    def detect(self, frame):
+        """Returns the Detection for this frame, or None if no target was found."""
+        height, width = frame.shape[:2]
+        if self.tracking and self.last is not None:
+            window = self._search_window(width, height)
+            target = self._search(frame, window)
+            self.window_searches += 1
+            if target is not None and self._near_edge(target, window, width, height):
+                target = None
+                self.misses = self.max_misses  # Possibly clipped; look at the whole frame now
+            if target is None:
+                self.misses += 1
+                if self.misses < self.max_misses:
+                    return None
+                target = self._search(frame, (0, 0, width, height))
+                self.full_searches += 1
+        else:
+            target = self._search(frame, (0, 0, width, height))
+            self.full_searches += 1
+
+        if target is None:
+            self.reset()
+            return None
+        if self.last is not None:
+            self._motion.append((abs(target.center_x - self.last.center_x),
+                                 abs(target.center_y - self.last.center_y)))
+        self.last = target
+        self.misses = 0
+        return target
+
+    def full_mask(self, shape, out=None):
+        """
+        Returns the last mask pasted into a frame-sized array, for display.
+
+        Without `out` the result may share memory with the detector's
+        buffers and is only valid until the next detect().
+        """
+        if out is None:
+            out = self._scratch.get('full', shape[:2])
+        if self.window is None or self.mask is None:
+            out.fill(0)
+            return out
+        x0, y0, x1, y1 = self.window
+        region = out
+        if (x0, y0, x1, y1) != (0, 0, shape[1], shape[0]):
+            out.fill(0)
+            region = out[y0:y1, x0:x1]
+        if self.mask.shape == region.shape:
+            np.copyto(region, self.mask)
+        else:
+            cv2.resize(self.mask, (x1 - x0, y1 - y0), dst=region, interpolation=cv2.INTER_NEAREST)  # Coarse mask
+        return out
+
+    def _search(self, frame, window):
+        x0, y0, x1, y1 = window
+        self.window = window
+        crop = frame[y0:y1, x0:x1]
+        scratch = self._scratch
+        if self.method == 'pyramid':
+            with threshold_stage:
+                width = max(1, (x1 - x0) // self.pyramid_scale)
+                height = max(1, (y1 - y0) // self.pyramid_scale)
+                small = cv2.resize(crop, (width, height), dst=scratch.get('small', (height, width, 3)),
+                                   interpolation=cv2.INTER_NEAREST)
+                self.mask = self.threshold(small, dst=scratch.get('mask', (height, width)))
+            with contour_stage:
+                return refine_largest_blob(crop, self.mask, self.threshold, self.min_area, offset=(x0, y0),
+                                           scratch=scratch)
+        with threshold_stage:
+            self.mask = self.threshold(crop, dst=scratch.get('mask', (y1 - y0, x1 - x0)))
+        with contour_stage:
+            return find_largest_blob(self.mask, self.min_area, offset=(x0, y0))
+
+    def _search_window(self, width, height):
+        last = self.last
+        move_x = max((dx for dx, _ in self._motion), default=0)
+        move_y = max((dy for _, dy in self._motion), default=0)
+        # Missed frames mean the target may be further away than usual
+        scale = self.motion_gain * (1 + self.misses)
+        margin_x = int(self.base_margin + scale * move_x)
+        margin_y = int(self.base_margin + scale * move_y)
+        return (max(0, last.x - margin_x), max(0, last.y - margin_y),
+                min(width, last.x + last.w + margin_x), min(height, last.y + last.h + margin_y))
+
+    def _near_edge(self, target, window, width, height):
+        x0, y0, x1, y1 = window
+        edge = self.edge_margin
+        return ((x0 > 0 and target.x - x0 < edge)
+                or (y0 > 0 and target.y - y0 < edge)
+                or (x1 < width and x1 - (target.x + target.w) < edge)
+                or (y1 < height and y1 - (target.y + target.h) < edge))
@@ -0,0 +1,126 @@
+import time
+
+
+class _AxisFilter:
+    """Constant-velocity Kalman filter for one image axis (position, velocity)."""
+
+    def __init__(self, position, process_noise, measurement_noise):
+        self.position = float(position)
+        self.velocity = 0.0
+        self.q = process_noise
+        self.r = measurement_noise
+        # Covariance [[p_pp, p_pv], [p_pv, p_vv]]; velocity starts unknown
+        self.p_pp = measurement_noise
+        self.p_pv = 0.0
+        self.p_vv = 1e4
+
+    def predict(self, dt):
+        self.position += self.velocity * dt
+        # P = F P F' + Q for F = [[1, dt], [0, 1]] and white-noise acceleration Q
+        dt2 = dt * dt
+        self.p_pp += dt * (2 * self.p_pv + dt * self.p_vv) + self.q * dt2 * dt2 / 4
+        self.p_pv += dt * self.p_vv + self.q * dt2 * dt / 2
+        self.p_vv += self.q * dt2
+
+    def update(self, measured):
+        s = self.p_pp + self.r
+        k_p = self.p_pp / s
+        k_v = self.p_pv / s
+        error = measured - self.position
+        self.position += k_p * error
+        self.velocity += k_v * error
+        self.p_vv -= k_v * self.p_pv
+        self.p_pv -= k_v * self.p_pp
+        self.p_pp -= k_p * self.p_pp
+
+    def extrapolate(self, dt):
+        return self.position + self.velocity * dt
+
+
+class TargetTracker:
+    """
+    Estimates where the target is, and where it is going, from timestamped detections.
+
+    A constant-velocity Kalman filter runs on the target centre in pixels.
+    Between detections the track coasts on its velocity for up to
+    `max_coast` seconds, so a few dropped detections do not lose the lock.
+    `predict(t)` extrapolates to any time, which lets the controller aim at
+    where the target will be once the motor has moved rather than where the
+    camera last saw it.
+    """
+
+    def __init__(self, process_noise=4000.0, measurement_noise=9.0, max_coast=0.6, max_speed=2000.0):
+        self.process_noise = process_noise  # Acceleration noise, px^2/s^4
+        self.measurement_noise = measurement_noise  # Detection jitter, px^2
+        self.max_coast = max_coast
+        self.max_speed = max_speed  # Clamp for velocity estimates, px/s
+        self.x = None
+        self.y = None
+        self.last_time = None
+        self.last_seen = None
+        self.coasting = False
+
+    @property
+    def locked(self):
+        return self.x is not None
+
+    def reset(self):
+        self.x = self.y = None
+        self.last_time = self.last_seen = None
+        self.coasting = False
+
+    def update(self, target, timestamp=None):
+        """
+        Advances the track to `timestamp` and folds in a detection, if any.
+
+        Args:
+            target: Detection for this frame, or None if nothing was found.
+            timestamp (float): Capture time in time.monotonic() seconds; defaults to now.
+
+        Returns:
+            bool: True while the track is alive (detected or coasting).
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if target is None:
+            if not self.locked:
+                return False
+            if timestamp - self.last_seen > self.max_coast:
+                self.reset()
+                return False
+            self._advance(timestamp)
+            self.coasting = True
+            return True
+
+        if not self.locked:
+            self.x = _AxisFilter(target.center_x, self.process_noise, self.measurement_noise)
+            self.y = _AxisFilter(target.center_y, self.process_noise, self.measurement_noise)
+        else:
+            self._advance(timestamp)
+            self.x.update(target.center_x)
+            self.y.update(target.center_y)
+            for axis in (self.x, self.y):
+                axis.velocity = max(-self.max_speed, min(self.max_speed, axis.velocity))
+        self.last_time = self.last_seen = timestamp
+        self.coasting = False
+        return True
+
+    def predict(self, timestamp):
+        """Returns the (x, y) the target is expected to be at, or None without a track."""
+        if not self.locked:
+            return None
+        dt = max(0.0, timestamp - self.last_time)
+        return self.x.extrapolate(dt), self.y.extrapolate(dt)
+
+    def velocity(self):
+        """Returns the estimated (vx, vy) in pixels per second."""
+        if not self.locked:
+            return 0.0, 0.0
+        return self.x.velocity, self.y.velocity
+
+    def _advance(self, timestamp):
+        dt = timestamp - self.last_time
+        if dt > 0:
+            self.x.predict(dt)
+            self.y.predict(dt)
+            self.last_time = timestamp
@@ -0,0 +1,245 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+BATCH = 256  # Records per batch handed to the writer thread
+BUFFERS = 4  # Batches that can be waiting to be written before records are dropped
+FLUSH_SECONDS = 1.0  # A partly filled batch is written after this long, so a crash loses little
+GROW_BYTES = 1 << 20  # The file and its mapping grow by this much at a time
+MAGIC = b'ABRSTLM1'
+TELEMETRY_DIR = os.environ.get('ABRS_TELEMETRY_DIR', 'telemetry')
+
+# Event codes stored with a record
+FRAME = 0
+CAPTURE_FAILED = 1
+CENTERED = 2  # TEST-final_pan: inside the tolerance, motor stopped
+MOVING_LEFT = 3
+MOVING_RIGHT = 4
+NO_TARGET = 5
+EVENT_NAMES = {FRAME: 'frame', CAPTURE_FAILED: 'capture failed', CENTERED: 'centered',
+               MOVING_LEFT: 'moving left', MOVING_RIGHT: 'moving right', NO_TARGET: 'no target'}
+
+# Limit switch bits in the `limits` field
+LIMIT_LEFT = 1
+LIMIT_RIGHT = 2
+
+RECORD_DTYPE = np.dtype([
+    ('time', 'f8'),  # time.monotonic() seconds
+    ('seq', 'i8'),  # Frame sequence number
+    ('event', 'u1'),
+    ('detected', 'u1'),
+    ('limits', 'u1'),  # Closed limit switches, LIMIT_LEFT | LIMIT_RIGHT
+    ('center_x', 'f4'), ('center_y', 'f4'),
+    ('area', 'f4'),
+    ('error', 'f4'),  # Pan error in pixels (320-wide reference pixels from the closed loop), NaN when unknown
+    ('velocity', 'f4'),  # Commanded pan velocity, steps per second
+    ('steps', 'i4'),  # Steps commanded for this frame (open-loop moves)
+    ('position', 'i4'),
+    ('steps_issued', 'i8'),
+])
+
+# File header: magic, record count (rewritten after every batch), dtype length, then the dtype as JSON
+_HEADER = struct.Struct('<8sQI')
+_COUNT_OFFSET = 8
+
+
+def _header_size(descr_size):
+    return (_HEADER.size + descr_size + 63) // 64 * 64  # Records start 64-byte aligned
+
+
+class TelemetryWriter:
+    """
+    Logs fixed-width per-frame records to a memory-mapped, append-only file.
+
+    record() fills the next row of a preallocated structured array; it never
+    formats text or touches the file. A batch is handed to a background
+    thread when it is full or has been open for `flush_seconds`; the thread
+    copies it into a memory-mapped file that grows in GROW_BYTES steps,
+    then updates the record count in the header. If the writer thread falls
+    BUFFERS batches behind, records are dropped and counted in `dropped`
+    rather than holding up the loop.
+
+    record() must only be called from one thread. Read a session back with
+    read_session().
+    """
+
+    def __init__(self, path, batch=BATCH, buffers=BUFFERS, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.count = 0  # Records written to the file
+        self.dropped = 0
+        self.flush_seconds = flush_seconds
+        self._free = [np.zeros(batch, dtype=RECORD_DTYPE) for _ in range(buffers)]
+        self._full = []  # (array, records) waiting for the writer thread
+        self._current = self._free.pop()
+        self._fill = 0
+        self._started = time.monotonic()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        descr = json.dumps(RECORD_DTYPE.descr).encode()
+        self._data_offset = _header_size(len(descr))
+        self._file = open(path, 'w+b')
+        self._file.write(_HEADER.pack(MAGIC, 0, len(descr)) + descr)
+        self._file.truncate(self._data_offset + GROW_BYTES)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+        self._thread.start()
+
+    def record(self, event=FRAME, seq=-1, target=None, error=None, velocity=0.0, steps=0, engine=None,
+               limits=None, timestamp=None):
+        """
+        Adds one record.
+
+        Args:
+            event (int): FRAME, or one of the other event codes.
+            seq (int): Frame sequence number.
+            target: Detection for the frame, or None.
+            error (float): Pan error in pixels, or None.
+            velocity (float): Commanded pan velocity.
+            steps (int): Steps commanded for this frame.
+            engine: MotionEngine to read position, steps issued and limit switches from.
+            limits (int): Limit switch bits, for callers without an engine.
+            timestamp (float): time.monotonic() seconds; defaults to now.
+        """
+        if self._current is None and not self._next_buffer():
+            self.dropped += 1
+            return
+        row = self._current[self._fill]
+        row['time'] = time.monotonic() if timestamp is None else timestamp
+        row['seq'] = seq
+        row['event'] = event
+        row['velocity'] = velocity
+        row['steps'] = steps
+        row['error'] = np.nan if error is None else error
+        if target is None:
+            row['detected'] = 0
+            row['center_x'] = row['center_y'] = np.nan
+            row['area'] = 0
+        else:
+            row['detected'] = 1
+            row['center_x'] = target.center_x
+            row['center_y'] = target.center_y
+            row['area'] = target.area
+        if engine is not None:
+            row['position'] = engine.position
+            row['steps_issued'] = engine.steps_issued
+            row['limits'] = engine.limit_state if limits is None else limits
+        else:
+            row['position'] = row['steps_issued'] = 0
+            row['limits'] = limits or 0
+        self._fill += 1
+        if self._fill == len(self._current) or time.monotonic() - self._started >= self.flush_seconds:
+            self._hand_off()
+
+    def flush(self):
+        """Hands the current partial batch to the writer thread."""
+        if self._fill:
+            self._hand_off()
+
+    def close(self):
+        """Writes everything recorded so far and closes the file, trimmed to the records it holds."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self._map.close()
+        self._file.truncate(self._data_offset + self.count * RECORD_DTYPE.itemsize)
+        self._file.close()
+
+    def _next_buffer(self):
+        with self._cond:
+            if not self._free:
+                return False
+            self._current = self._free.pop()
+            self._fill = 0
+            self._started = time.monotonic()
+            return True
+
+    def _hand_off(self):
+        with self._cond:
+            self._full.append((self._current, self._fill))
+            self._current = self._free.pop() if self._free else None
+            self._fill = 0
+            self._started = time.monotonic()
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._full or self._closed)
+                batches, self._full = self._full, []
+                closed = self._closed
+            for array, records in batches:
+                self._write(array[:records])
+                with self._cond:
+                    self._free.append(array)
+            if closed:
+                return
+
+    def _write(self, records):
+        start = self._data_offset + self.count * RECORD_DTYPE.itemsize
+        end = start + records.nbytes
+        if end > len(self._map):
+            self._map.close()
+            self._file.truncate(end + GROW_BYTES)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map[start:end] = records.tobytes()
+        self.count += len(records)
+        struct.pack_into('<Q', self._map, _COUNT_OFFSET, self.count)
+
+
+def read_session(path):
+    """
+    Loads a telemetry file into a RECORD_DTYPE array.
+
+    Works on a file still being written or left behind by a crash: only the
+    records counted in the header are read.
+    """
+    with open(path, 'rb') as f:
+        magic, count, descr_size = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a telemetry file")
+        dtype = np.dtype([tuple(field) for field in json.loads(f.read(descr_size))])
+        f.seek(_header_size(descr_size))
+        return np.fromfile(f, dtype=dtype, count=count)
+
+
+def session_path(directory=TELEMETRY_DIR):
+    """Returns a new telemetry file name for a session starting now."""
+    return os.path.join(directory, time.strftime('session-%Y%m%d-%H%M%S.tlm'))
+
+
+def summarize(records):
+    """Returns a one-screen text summary of a session: duration, detection rate, event counts, frame gaps."""
+    if not len(records):
+        return "0 records"
+    duration = records['time'][-1] - records['time'][0]
+    gaps = np.diff(records['time'])
+    lines = [f"{len(records)} records over {duration:.1f} s, target detected in "
+             f"{records['detected'].mean() * 100:.0f}%"]
+    events, counts = np.unique(records['event'], return_counts=True)
+    lines.append("events: " + ", ".join(f"{EVENT_NAMES.get(int(e), e)} {c}" for e, c in zip(events, counts)))
+    if len(gaps):
+        lines.append(f"frame gap: median {np.median(gaps) * 1000:.1f} ms, max {gaps.max() * 1000:.1f} ms")
+    error = records['error'][~np.isnan(records['error'])]
+    if len(error):
+        lines.append(f"pan error: rms {np.sqrt(np.mean(error ** 2)):.1f} px, max {np.abs(error).max():.1f} px")
+    limits = np.count_nonzero(records['limits'])
+    if limits:
+        lines.append(f"{limits} records with a limit switch closed")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        print(f"{path}:\n{summarize(read_session(path))}")
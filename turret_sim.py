@@ -0,0 +1,238 @@
+import math
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+import motor_control
+from motor_control import (DIR_PIN, LIMIT_LEFT_PIN, LIMIT_RIGHT_PIN, STEP_PIN, TILT_DIR_PIN, TILT_LIMIT,
+                           TILT_STEP_PIN, SimulatedBackend)
+from pan_controller import DEADBAND, PanController
+from vision_pipeline import PIXELS_PER_STEP, PIXELS_PER_TILT_STEP, VisionPipeline
+
+FRAME_SIZE = (320, 240)  # (width, height) of the simulated camera
+CAMERA_FPS = 15
+CAMERA_LATENCY = 0.03  # Seconds from exposure to the frame reaching the vision loop
+PAN_TRAVEL = 800  # Steps either side of center before a limit switch closes, as setup_motor_gpio simulates
+TARGET_AXES = (18, 28)  # Half width and height of the red target, in pixels
+TARGET_COLOR = (40, 0, 230)  # BGR
+SETTLE_BAND = 2 * DEADBAND  # Pixels; settled once the error stays inside this
+MODES = ('closed', 'open')  # PanController on the pipeline's error, or per-frame move_motor() bursts
+
+# A scripted target: `position(t)` gives (x, y) in the frame the camera sees at pan and
+# tilt 0, `changes` the times its motion changes abruptly, from which settle time is measured
+Scenario = namedtuple('Scenario', ['name', 'duration', 'position', 'changes'])
+
+
+def _walk(t):
+    return 190 + 40 * t, 130 + 6 * math.sin(2 * math.pi * 1.8 * t)  # Bobbing slightly with each stride
+
+
+def _sprint(t):
+    run = min(max(t - 1.0, 0.0), 2.5)  # Stands for a second, then 2.5 s at 250 px/s
+    return 170 + 250 * run, 120 - 8 * run
+
+
+def _direction_change(t):
+    turn = 3.0
+    return (160 + 90 * min(t, turn) - 90 * max(t - turn, 0.0)), 115.0
+
+
+SCENARIOS = {
+    'walk': Scenario('walk', 6.0, _walk, (0.0,)),
+    'sprint': Scenario('sprint', 6.0, _sprint, (0.0, 1.0, 3.5)),
+    'direction-change': Scenario('direction-change', 6.0, _direction_change, (0.0, 3.0)),
+}
+
+
+class TurretScene:
+    """
+    Renders what a camera on the pan/tilt stage sees.
+
+    The background is a fixed panorama wide and tall enough for the whole
+    travel of both axes, so the scene slides through the frame as the
+    camera turns, just as it would on the turret. Pan shifts the image
+    `pixels_per_step` left per step right, and tilt shifts it
+    `pixels_per_tilt_step` down per step up, the model VisionPipeline
+    compensates with. The red target is drawn on top at its position in
+    the frame.
+    """
+
+    def __init__(self, size=FRAME_SIZE, pan_travel=PAN_TRAVEL, tilt_travel=TILT_LIMIT,
+                 pixels_per_step=PIXELS_PER_STEP, pixels_per_tilt_step=PIXELS_PER_TILT_STEP, seed=0):
+        width, height = size
+        self.size = size
+        self.pixels_per_step = pixels_per_step
+        self.pixels_per_tilt_step = pixels_per_tilt_step
+        self.margin_x = int(math.ceil(pan_travel * pixels_per_step))
+        self.margin_y = int(math.ceil(tilt_travel * pixels_per_tilt_step))
+        rng = np.random.default_rng(seed)
+        shape = (height + 2 * self.margin_y, width + 2 * self.margin_x, 3)
+        panorama = rng.integers(20, 120, shape, dtype=np.uint8)
+        panorama = cv2.GaussianBlur(panorama, (0, 0), 3)
+        for _ in range(shape[0] * shape[1] // 4000):  # Green, blue and grey clutter; nothing red
+            x, y = int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0]))
+            w, h = (int(v) for v in rng.integers(8, 60, 2))
+            color = [int(c) for c in rng.integers(40, 160, 3)]
+            color[2] = min(color[2], color[1])  # Keeps the clutter out of the red hue range
+            cv2.rectangle(panorama, (x, y), (x + w, y + h), color, -1)
+        self.panorama = panorama
+        self.frame = np.empty((height, width, 3), dtype=np.uint8)
+
+    def image_position(self, position, pan, tilt):
+        """Where a target at `position` (x, y at pan and tilt 0) appears in the frame at this pose."""
+        return position[0] - self.pixels_per_step * pan, position[1] + self.pixels_per_tilt_step * tilt
+
+    def render(self, position, pan, tilt):
+        """
+        Returns the frame seen at a pose, and the target's true (x, y) in it.
+
+        The frame is a buffer reused by the next call.
+        """
+        width, height = self.size
+        x0 = int(round(self.margin_x + self.pixels_per_step * pan))
+        y0 = int(round(self.margin_y - self.pixels_per_tilt_step * tilt))
+        x0 = min(max(x0, 0), self.panorama.shape[1] - width)
+        y0 = min(max(y0, 0), self.panorama.shape[0] - height)
+        np.copyto(self.frame, self.panorama[y0:y0 + height, x0:x0 + width])
+        image_x, image_y = self.image_position(position, pan, tilt)
+        cv2.ellipse(self.frame, (int(round(image_x)), int(round(image_y))), TARGET_AXES, 0, 0, 360,
+                    TARGET_COLOR, -1)
+        return self.frame, (image_x, image_y)
+
+
+def settle_times(times, errors, changes, duration, band=SETTLE_BAND):
+    """
+    Returns, for each change in the target's motion, how long the error took to stay inside `band`.
+
+    The error has to stay inside until the next change (or the end of the
+    run); None means it never did.
+    """
+    times = np.asarray(times)
+    errors = np.abs(np.asarray(errors))
+    settled = []
+    for index, start in enumerate(changes):
+        end = changes[index + 1] if index + 1 < len(changes) else duration
+        window = (times >= start) & (times < end)
+        outside = np.flatnonzero(window & (errors > band))
+        if not window.any():
+            settled.append(None)
+        elif not len(outside):
+            settled.append(0.0)
+        else:
+            after = np.flatnonzero(window)
+            after = after[after > outside[-1]]
+            settled.append(float(times[after[0]] - start) if len(after) else None)
+    return settled
+
+
+def _stats(errors):
+    errors = np.abs(np.asarray(errors, dtype=np.float64))
+    if not len(errors):
+        return {}
+    return {'rms': float(np.sqrt(np.mean(errors ** 2))), 'p95': float(np.percentile(errors, 95)),
+            'max': float(errors.max())}
+
+
+def run(scenario, mode='closed', fps=CAMERA_FPS, latency=CAMERA_LATENCY, size=FRAME_SIZE, method=None, gate=True,
+        scene=None):
+    """
+    Tracks a scripted target in real time and returns the results dictionary.
+
+    The real MotionEngine drives a SimulatedBackend; the camera's pose is
+    the axis position the backend counts from the step pulses, not what
+    the engine believes. Each frame is rendered from that pose, held for
+    `latency`, then run through VisionPipeline.process() exactly as
+    process_video does; in 'closed' mode PanControllers steer both axes
+    from the pipeline's error estimate, in 'open' mode the pipeline calls
+    move_motor() itself. Tracking error is measured against where the
+    target really was in each frame.
+
+    Needs motor_control.engine to be unset; it is torn down again afterwards.
+
+    Args:
+        scenario (Scenario or str): Target trajectory, or a name in SCENARIOS.
+        mode (str): One of MODES.
+        method (str): Detection method; defaults to the pipeline's.
+        gate (bool): Use the motion gate.
+        scene (TurretScene): Reused between runs to skip building the panorama.
+    """
+    if isinstance(scenario, str):
+        scenario = SCENARIOS[scenario]
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {MODES}")
+    scene = scene or TurretScene(size)
+    width, height = scene.size
+    backend = SimulatedBackend()
+    backend.add_travel(STEP_PIN, DIR_PIN, LIMIT_LEFT_PIN, LIMIT_RIGHT_PIN, -PAN_TRAVEL, PAN_TRAVEL)
+    backend.add_travel(TILT_STEP_PIN, TILT_DIR_PIN, None, None, -TILT_LIMIT, TILT_LIMIT)
+    engine = motor_control.setup_motor_gpio(backend)
+    pipeline = VisionPipeline(width, closed_loop=mode == 'closed', frame_height=height, gate=gate)
+    if method is not None:
+        pipeline.detector.method = method
+    controllers = []
+    if mode == 'closed':
+        controllers.append(PanController(engine, pipeline.pan_error, feedforward=pipeline.pan_feedforward).start())
+        controllers.append(PanController(engine, pipeline.tilt_error, feedforward=pipeline.tilt_feedforward,
+                                         axis='tilt').start())
+
+    period = 1.0 / fps
+    times, pan_errors, tilt_errors, process_times = [], [], [], []
+    detections = 0
+    try:
+        start = time.monotonic()
+        next_frame = start
+        while True:
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            captured = time.monotonic()
+            t = captured - start
+            if t >= scenario.duration:
+                break
+            pan = backend.axis_position(STEP_PIN)
+            tilt = backend.axis_position(TILT_STEP_PIN)
+            frame, (image_x, image_y) = scene.render(scenario.position(t), pan, tilt)
+            times.append(t)
+            pan_errors.append(image_x - width / 2)
+            tilt_errors.append(image_y - height / 2)
+
+            delay = captured + latency - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.perf_counter()
+            detections += pipeline.process(frame, captured) is not None
+            process_times.append(time.perf_counter() - started)
+            # A frame that ran long makes the camera's next frame the one the loop gets next
+            next_frame = max(next_frame + period, time.monotonic())
+        elapsed = time.monotonic() - start
+    finally:
+        for controller in controllers:
+            controller.stop()
+        steps = engine.steps_issued
+        deadlines = {'motion': {'misses': engine.late_pulses, 'max_lateness': engine.max_lateness}}
+        deadlines.update((f'{controller.axis}_control', controller.deadlines.stats()) for controller in controllers)
+        mismatch = abs(engine.position - backend.axis_position(STEP_PIN))
+        motor_control.cleanup_motor_gpio()
+
+    process_ms = np.asarray(process_times) * 1000
+    frames = len(times)
+    return {
+        'scenario': scenario.name,
+        'mode': mode,
+        'method': pipeline.detector.method,
+        'frames': frames,
+        'duration_s': elapsed,
+        'camera_fps': fps,
+        'loop_hz': frames / elapsed if elapsed else 0.0,
+        'process_ms': {'mean': float(process_ms.mean()), 'p95': float(np.percentile(process_ms, 95)),
+                       'max': float(process_ms.max())} if frames else {},
+        'detection_rate': detections / frames if frames else 0.0,
+        'pan_error_px': _stats(pan_errors),
+        'tilt_error_px': _stats(tilt_errors),
+        'settle_s': settle_times(times, pan_errors, scenario.changes, scenario.duration),
+        'steps_per_s': steps / elapsed if elapsed else 0.0,
+        'deadlines': deadlines,
+        'step_mismatch': mismatch,  # Engine position against the pulses counted; anything but 0 is a lost step
+    }
@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import deque
+
+import metrics
+import motor_control
+from motion_gate import MotionGate
+from motor_control import STEP_RATE, move_motor
+from target_detection import RedTargetDetector
+from target_tracker import TargetTracker
+
+# HSV color thresholding values for red; the hue range wraps past 180 to also catch hue 0-10
+hueLow, hueHigh = 170, 190
+satLow, satHigh = 70, 255
+valLow, valHigh = 50, 255
+min_contour_area = 500  # At 320x240; VisionPipeline rescales it with the resolution
+detection_method = 'contour'  # Or 'pyramid': coarse blob search, centroid refined at full resolution
+motion_gating = True  # Reuse the last detection while the tracked region of the frame is unchanged
+K_p = 0.05
+ACTUATION_DELAY = 0.02  # Seconds from handing off a move to the first step pulse
+PIXELS_PER_STEP = 1.2  # How far the image shifts per pan step; calibrate per camera/microstep setting
+PIXELS_PER_TILT_STEP = 1.2  # How far the image shifts down per tilt step up; negate if tilt is wired reversed
+# Frame width the pixel-based tuning is for: pan_error() and tilt_error() are reported in pixels of a
+# frame this wide, so the PanController gains and deadband mean the same angle at any capture resolution
+REFERENCE_WIDTH = 320
+REFERENCE_HEIGHT = 240  # min_contour_area and PIXELS_PER_*_STEP are for a REFERENCE_WIDTH x REFERENCE_HEIGHT frame
+
+detect_stage = metrics.stage('detect', "Target detection, thresholding and contours included")
+control_stage = metrics.stage('control', "Pan control and motor hand-off")
+
+
+def make_detector():
+    """Returns a RedTargetDetector with the pipeline's thresholds, e.g. for a detection worker process."""
+    return RedTargetDetector((hueLow, satLow, valLow), (hueHigh, satHigh, valHigh), min_contour_area, tracking=True,
+                             method=detection_method)
+
+
+class VisionPipeline:
+    """
+    Detection and pan control for one frame at a time.
+
+    This is the logic process_video runs on every camera frame, kept free of
+    any camera, Flask or pygame state so the replay benchmark can push
+    recorded frames through exactly the same code.
+
+    Detections go through a TargetTracker, and control acts on where the
+    target is predicted to be once the correction has been stepped out
+    (frame age + actuation delay + move time). While the tracker coasts
+    through a short dropout, control keeps following the prediction.
+
+    With `closed_loop` set, control() only feeds the tracker and the motor
+    is driven by a PanController that polls pan_error() at a fixed rate.
+    The tracker then works in pan-compensated coordinates (image x plus
+    how far the camera has panned), so the estimate stays valid while the
+    turret moves between frames. Given a `frame_height`, target y feeds
+    tilt the same way: tilt_error() and tilt_feedforward() drive a second
+    controller on the engine's tilt axis.
+
+    Unless `gate` is False, a MotionGate skips detection on frames whose
+    tracked region has not changed and reuses the last result.
+
+    `pixels_per_step`, `pixels_per_tilt_step` and the detector's min_area
+    are for a REFERENCE_WIDTH x REFERENCE_HEIGHT frame; they are scaled to
+    the frame size given, as set_frame_size() does.
+    """
+
+    def __init__(self, frame_width, detector=None, move=move_motor, gain=K_p, tracker=None,
+                 actuation_delay=ACTUATION_DELAY, step_rate=STEP_RATE, closed_loop=False,
+                 pixels_per_step=PIXELS_PER_STEP, motor_position=None, frame_height=None,
+                 pixels_per_tilt_step=PIXELS_PER_TILT_STEP, tilt_position=None, gate=None):
+        self.detector = detector or make_detector()
+        if gate is None:
+            gate = motion_gating
+        self.gate = MotionGate() if gate is True else (gate or None)
+        self.tracker = tracker or TargetTracker()
+        self.move = move
+        self.gain = gain
+        self.actuation_delay = actuation_delay
+        self.step_rate = step_rate
+        self.frame_center_x = REFERENCE_WIDTH // 2  # set_frame_size() below scales to the real size
+        self.frame_center_y = REFERENCE_HEIGHT // 2 if frame_height else None
+        self.error_scale = 1.0  # Frame pixels to reference pixels
+        self.previous_center_x = self.frame_center_x  # Start from the frame center
+        self.predicted_x = None
+        self.step_size = 0
+        self.closed_loop = closed_loop
+        self.pixels_per_step = pixels_per_step
+        self.motor_position = motor_position or (lambda: motor_control.engine.position if motor_control.engine else 0)
+        self.pixels_per_tilt_step = pixels_per_tilt_step
+        self.tilt_position = tilt_position or (
+            lambda: motor_control.engine.tilt_position if motor_control.engine else 0)
+        self.predicted_y = None
+        self._positions = deque(maxlen=64)  # (time, pan position, tilt position) seen by pan_error
+        self._lock = threading.Lock()  # The tracker is fed and read from different threads
+        self.set_frame_size(frame_width, frame_height)
+
+    def set_frame_size(self, frame_width, frame_height=None):
+        """
+        Rescales everything measured in pixels for a new capture resolution.
+
+        The frame center, the detector's minimum area, the pixels-per-step
+        calibration and the scale the control errors are reported in follow
+        the new size; the track is dropped, since its positions and
+        velocities are in the old pixels.
+        """
+        scale_x = frame_width / (self.frame_center_x * 2)
+        if frame_height and self.frame_center_y:
+            scale_y = frame_height / (self.frame_center_y * 2)
+        else:
+            scale_y = scale_x
+        with self._lock:
+            self.frame_center_x = frame_width // 2
+            self.frame_center_y = frame_height // 2 if frame_height else None
+            self.error_scale = REFERENCE_WIDTH / frame_width
+            self.previous_center_x = self.frame_center_x
+            self.predicted_x = self.predicted_y = None
+            self.pixels_per_step *= scale_x
+            self.pixels_per_tilt_step *= scale_y
+            self.detector.min_area *= scale_x * scale_y
+            self.detector.reset()
+            self.tracker.reset()
+
+    def detect(self, frame):
+        """Returns the Detection for a frame, or None."""
+        gate = self.gate
+        if gate is None:
+            return self.detector.detect(frame)
+        if gate.unchanged(frame):
+            return gate.last
+        start = time.perf_counter()
+        target = self.detector.detect(frame)
+        gate.remember(target, time.perf_counter() - start, frame.shape)
+        return target
+
+    def control(self, target, frame_time=None, now=None):
+        """
+        Hands a pan correction for a detection to the motor.
+
+        Args:
+            target: Detection for the frame, or None if nothing was found.
+            frame_time (float): Capture time in time.monotonic() seconds; defaults to now.
+            now (float): Current time on the same clock; replays pass their own.
+
+        Returns:
+            tuple: (step_size, direction) where direction is 'L', 'R' or None.
+        """
+        if now is None:
+            now = time.monotonic()
+        if frame_time is None:
+            frame_time = now
+        if self.closed_loop:
+            if target is not None:
+                # Undo the camera's own pan and tilt so the tracker sees how the target moves
+                pan, tilt = self._position_at(frame_time)
+                target = target._replace(center_x=target.center_x + self.pixels_per_step * pan,
+                                         center_y=target.center_y - self.pixels_per_tilt_step * tilt)
+            with self._lock:
+                self.tracker.update(target, frame_time)
+            return 0, None
+        if not self.tracker.update(target, frame_time):
+            self.predicted_x = None
+            return 0, None
+
+        # Aim where the target will be when this move finishes, not where it was seen
+        lead = now - frame_time + self.actuation_delay
+        center_x = self.tracker.predict(frame_time + lead)[0]
+        self.step_size = int(self.gain * abs(center_x - self.frame_center_x))
+        lead += self.step_size / self.step_rate
+        center_x = int(round(self.tracker.predict(frame_time + lead)[0]))
+        self.predicted_x = center_x
+        offset_x = center_x - self.frame_center_x
+        self.step_size = int(self.gain * abs(offset_x))
+
+        # Determine movement direction; the move is only handed to the
+        # motion engine, so this never stalls the loop
+        direction = None
+        if center_x < self.previous_center_x:  # Object moved left
+            direction = 'L'
+        elif center_x > self.previous_center_x:  # Object moved right
+            direction = 'R'
+        if direction is not None:
+            self.move(self.step_size, direction)
+
+        # Update previous center position
+        self.previous_center_x = center_x
+        return self.step_size, direction
+
+    def pan_error(self, now=None):
+        """
+        Returns the estimated error from frame center for the closed-loop controller.
+
+        In REFERENCE_WIDTH pixels whatever the capture resolution. Positive
+        means the target is right of center; None means there is no track.
+        """
+        if now is None:
+            now = time.monotonic()
+        position = self.motor_position()
+        self._positions.append((now, position, self.tilt_position()))
+        with self._lock:
+            predicted = self.tracker.predict(now + self.actuation_delay)
+        if predicted is None:
+            self.predicted_x = None
+            return None
+        self.predicted_x = int(round(predicted[0] - self.pixels_per_step * position))
+        return (predicted[0] - self.pixels_per_step * position - self.frame_center_x) * self.error_scale
+
+    def pan_feedforward(self, now=None):
+        """Returns the pan velocity, in steps per second, that would keep pace with the target."""
+        with self._lock:
+            velocity_x = self.tracker.velocity()[0]
+        return velocity_x / self.pixels_per_step
+
+    def tilt_error(self, now=None):
+        """
+        Returns the estimated error from frame center for the tilt controller, in REFERENCE_WIDTH pixels.
+
+        Positive means the target is above center (tilt up); None means there
+        is no track, or no frame height to find the center with.
+        """
+        if self.frame_center_y is None:
+            return None
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            predicted = self.tracker.predict(now + self.actuation_delay)
+        if predicted is None:
+            self.predicted_y = None
+            return None
+        image_y = predicted[1] + self.pixels_per_tilt_step * self.tilt_position()
+        self.predicted_y = int(round(image_y))
+        return (self.frame_center_y - image_y) * self.error_scale
+
+    def tilt_feedforward(self, now=None):
+        """Returns the tilt velocity, in steps per second, that would keep pace with the target."""
+        with self._lock:
+            velocity_y = self.tracker.velocity()[1]
+        return -velocity_y / self.pixels_per_tilt_step
+
+    def _position_at(self, timestamp):
+        """(pan, tilt) motor position at `timestamp`, from the samples pan_error() has recorded."""
+        samples = tuple(self._positions)  # Snapshot; the controller thread keeps appending
+        for sample_time, position, tilt in reversed(samples):
+            if sample_time <= timestamp:
+                return position, tilt
+        if samples:
+            return samples[0][1:]
+        return self.motor_position(), self.tilt_position()
+
+    def process(self, frame, frame_time=None):
+        """Runs detection and control on a frame and returns the Detection."""
+        with detect_stage:
+            target = self.detect(frame)
+        with control_stage:
+            self.control(target, frame_time)
+        return target
@@ -0,0 +1,203 @@
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+import pygame
+
+import camera_control
+import motor_control
+import realtime
+import startup_trace
+from frame_encoder import PublishedFrame
+from motion_gate import MotionGate
+from motor_control import cleanup_motor_gpio, home_motor, setup_motor_gpio
+from pan_controller import PanController
+from shared_frames import SharedFrameRing
+from target_detection import Detection
+from telemetry import FRAME, TelemetryWriter, session_path
+from vision_pipeline import VisionPipeline, make_detector
+
+RING_SLOTS = 5  # Writing + latest + HELD_FRAMES pinned for viewers + one spare
+HELD_FRAMES = 2  # Published frames kept pinned so a viewer mid-encode never sees the slot reused
+
+
+class SharedVelocity:
+    """Stands in for the PanController in the UI process; reads the speed the control process shares."""
+
+    def __init__(self, value):
+        self._value = value
+
+    @property
+    def velocity(self):
+        return self._value.value
+
+
+def capture_worker(ring, results, stop, camera_index=0):
+    """
+    Vision process: captures straight into the shared ring and detects on each frame in place.
+
+    Only (sequence, capture time, detection tuple) goes back to the control
+    process; the UI process picks the pixels up from the ring.
+    """
+    results.cancel_join_thread()  # Never block exiting on results the control process stopped reading
+    realtime.pin_thread(realtime.VISION_CPUS)
+    realtime.configure_opencv()
+    cap = camera_control.open_camera(camera_index)
+    if cap is None:
+        stop.set()
+        ring.close()
+        return
+    detector = make_detector()
+    gate = MotionGate()
+    deadlines = realtime.DeadlineMonitor('vision')
+    period = 1.0 / camera_control.CAMERA_FPS
+    height, width = ring.shape[:2]
+    seq = 0
+    while not stop.is_set():
+        index = ring.claim(timeout=1.0)
+        if index is None:
+            continue
+        slot = ring.frame(index)
+        success, frame = cap.read(slot)
+        timestamp = time.monotonic()
+        if not success:
+            print("Error: Video capture stopped")
+            break
+        if frame is not slot:
+            # The camera did not take the requested format; fit the frame to the slot
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (width, height), dst=slot)
+        if gate.unchanged(slot):
+            target = gate.last
+        else:
+            start = time.perf_counter()
+            target = detector.detect(slot)
+            gate.remember(target, time.perf_counter() - start, slot.shape)
+        detector.full_mask(slot.shape, out=ring.mask(index))
+        ring.commit(index, seq, timestamp, target)
+        results.put((seq, timestamp, None if target is None else tuple(target)))
+        deadlines.observe(time.monotonic() - timestamp - period)
+        seq += 1
+    print(f"Vision deadlines: {deadlines.stats()}")
+    cap.release()
+    stop.set()
+    ring.close()
+
+
+def publish_frames(ring, stop):
+    """Feeds frames from the ring to camera_control.hub for the /video_feed viewers of this process."""
+    hub = camera_control.hub
+    hub.reopen()
+    held = deque()
+    last_seq = -1
+    while not stop.is_set():
+        shared = ring.acquire(last_seq, timeout=1.0)
+        if shared is None:
+            if ring.closed:
+                break
+            continue
+        last_seq = shared.seq
+        if not hub.subscriber_count:
+            shared.release()
+            continue
+        hub.publish(PublishedFrame(shared.frame, shared.target, shared.mask))
+        held.append(shared)
+        while len(held) > HELD_FRAMES:
+            held.popleft().release()
+    hub.close()
+    for shared in held:
+        shared.release()
+
+
+def ui_worker(ring, stop, velocity, port=8080):
+    """UI process: the streaming server and the pygame Stop button, away from the vision and control GILs."""
+    camera_control.pan = SharedVelocity(velocity)
+    threading.Thread(target=publish_frames, args=(ring, stop), name="publish-frames", daemon=True).start()
+    flask_thread = threading.Thread(target=camera_control.serve, args=(port,))
+    flask_thread.daemon = True
+    flask_thread.start()
+
+    def close_on_stop():
+        # Capture failed or the control process is shutting down: close the Stop window too
+        stop.wait()
+        if pygame.get_init():
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+
+    threading.Thread(target=close_on_stop, name="ui-stop", daemon=True).start()
+    camera_control.display_stop_button()
+    stop.set()
+
+
+def run_multiprocess(port=8080, camera_index=0):
+    """
+    Camera control split across processes, so capture and detection, the UI and
+    the pan loop each get their own interpreter (and core) instead of sharing a GIL.
+
+    - vision process: camera capture and detection, writing into a SharedFrameRing
+    - UI process: Flask /video_feed and the pygame Stop button, reading the ring
+    - this process: target tracking, the PanController and the motion engine
+
+    Frames never leave shared memory; the only thing queued between processes
+    is a small (sequence, capture time, detection) tuple per frame. /metrics in
+    this mode only covers the UI process.
+    """
+    # Fork before any thread is started here (motion engine, pan loop), so no child inherits one
+    context = multiprocessing.get_context('fork')
+    ring = SharedFrameRing((camera_control.FRAME_HEIGHT, camera_control.FRAME_WIDTH, 3), RING_SLOTS, context)
+    results = context.Queue()
+    stop = context.Event()
+    velocity = context.Value('d', 0.0, lock=False)
+    workers = [
+        context.Process(target=capture_worker, args=(ring, results, stop, camera_index), name="vision"),
+        context.Process(target=ui_worker, args=(ring, stop, velocity, port), name="ui"),
+    ]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    engine = setup_motor_gpio()
+    if not engine.homed:
+        home_motor()
+    pipeline = VisionPipeline(camera_control.FRAME_WIDTH, closed_loop=True, frame_height=camera_control.FRAME_HEIGHT)
+    pan = PanController(engine, pipeline.pan_error, feedforward=pipeline.pan_feedforward).start()
+    tilt = None
+    if engine.has_tilt:
+        tilt = PanController(engine, pipeline.tilt_error, feedforward=pipeline.tilt_feedforward, axis='tilt').start()
+    tracked = False
+    log = TelemetryWriter(session_path()) if camera_control.TELEMETRY else None
+    try:
+        while not stop.is_set():
+            try:
+                seq, frame_time, target = results.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if target is not None:
+                target = Detection(*target)
+            pipeline.control(target, frame_time)
+            if target is not None and not tracked:
+                tracked = True
+                startup_trace.mark(startup_trace.FIRST_TRACK)
+            velocity.value = pan.velocity
+            if log is not None:
+                log.record(FRAME, seq, target, pan.error, pan.velocity, engine=engine, timestamp=frame_time)
+    finally:
+        stop.set()
+        ring.close()
+        pan.stop()
+        if tilt is not None:
+            tilt.stop()
+        if log is not None:
+            log.close()
+        for worker in workers:
+            worker.join(2.0)
+            if worker.is_alive():
+                worker.terminate()
+        print(f"Capture stats: {ring.stats()}, steps issued: {motor_control.engine.steps_issued}")
+        ring.unlink()
+        cleanup_motor_gpio()